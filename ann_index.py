@@ -0,0 +1,222 @@
+"""
+Modul ANN Index - backend indeks pencarian untuk galeri wajah
+
+Backend yang tersedia:
+    exact : brute-force, semua baris galeri dinilai (default)
+    ivf   : inverted file dengan coarse quantizer (spherical k-means).
+            Query hanya dinilai terhadap baris di nprobe cluster terdekat,
+            lalu kandidat tersebut diurutkan dengan cosine similarity exact.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+
+class ExactIndex:
+    """Backend brute-force: tidak ada struktur tambahan, semua baris kandidat"""
+
+    name = 'exact'
+
+    def build(self, matrix):
+        """Bangun state indeks untuk matriks galeri"""
+        return None
+
+    def update(self, state, matrix, keep, new_matrix):
+        """Perbarui state indeks setelah delta galeri"""
+        return None
+
+    def candidates(self, state, query):
+        """
+        Returns:
+            Array index baris kandidat (terurut), atau None berarti semua baris
+        """
+        return None
+
+
+class IVFState:
+    """State IVF yang immutable untuk satu versi galeri"""
+
+    def __init__(self, centroids, assignments):
+        self.centroids = centroids
+        self.assignments = assignments
+        # Inverted lists: baris diurutkan per cluster, offsets[c]:offsets[c+1]
+        self.order = np.argsort(assignments, kind='stable')
+        self.offsets = np.searchsorted(
+            assignments[self.order], np.arange(centroids.shape[0] + 1)
+        )
+
+
+class IVFIndex:
+    """
+    Inverted file index dengan coarse quantizer spherical k-means.
+
+    Centroid disimpan ke file .npz sehingga worker yang baru start tidak perlu
+    melatih ulang; penempatan baris ke cluster cukup satu perkalian matriks.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, nlist=64, nprobe=8, path=None, train_iters=15,
+                 retrain_growth=2.0, seed=42):
+        """
+        Args:
+            nlist: Jumlah cluster coarse quantizer
+            nprobe: Jumlah cluster yang diperiksa per query (recall vs latency)
+            path: Path file .npz untuk menyimpan centroid (None = tidak disimpan)
+            train_iters: Jumlah iterasi k-means
+            retrain_growth: Latih ulang jika galeri tumbuh melebihi faktor ini
+            seed: Seed random untuk inisialisasi k-means
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.path = path
+        self.train_iters = train_iters
+        self.retrain_growth = retrain_growth
+        self.seed = seed
+
+    def _train(self, matrix):
+        """Latih centroid dengan spherical k-means (matrix sudah ter-normalisasi)"""
+        rng = np.random.default_rng(self.seed)
+        n = matrix.shape[0]
+
+        # Sampel training dibatasi agar waktu training tetap wajar
+        max_train = self.nlist * 256
+        sample = matrix[rng.choice(n, max_train, replace=False)] if n > max_train else matrix
+
+        centroids = sample[rng.choice(sample.shape[0], self.nlist, replace=False)].copy()
+        for _ in range(self.train_iters):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=self.nlist)
+
+            # Cluster kosong diisi ulang dengan titik acak
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()), replace=False)]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        return centroids
+
+    def _load_centroids(self, dim, n):
+        """Muat centroid dari file jika masih valid untuk galeri saat ini"""
+        if not self.path or not os.path.exists(self.path):
+            return None
+
+        try:
+            with np.load(self.path) as data:
+                centroids = data['centroids'].astype(np.float32)
+                trained_size = int(data['trained_size'])
+        except Exception as e:
+            print(f"Error loading IVF index {self.path}: {str(e)}")
+            return None
+
+        if centroids.shape != (self.nlist, dim):
+            return None
+        if n > trained_size * self.retrain_growth:
+            print(f"IVF index outdated (trained on {trained_size}, gallery {n}), retraining")
+            return None
+
+        return centroids
+
+    def _save_centroids(self, centroids, n):
+        """Simpan centroid secara atomik (tulis file sementara lalu rename)"""
+        if not self.path:
+            return
+
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.npz.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, centroids=centroids, trained_size=np.int64(n))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error saving IVF index {self.path}: {str(e)}")
+
+    def _assign(self, centroids, matrix):
+        """Tentukan cluster terdekat untuk setiap baris"""
+        if matrix.shape[0] == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.argmax(matrix @ centroids.T, axis=1)
+
+    def build(self, matrix):
+        """
+        Bangun state IVF untuk matriks galeri
+
+        Returns:
+            IVFState, atau None jika galeri terlalu kecil (fallback ke exact)
+        """
+        n, dim = matrix.shape
+        if n < self.nlist * 4:
+            return None
+
+        centroids = self._load_centroids(dim, n)
+        if centroids is None:
+            centroids = self._train(matrix)
+            self._save_centroids(centroids, n)
+            print(f"IVF index trained: {self.nlist} lists over {n} embeddings")
+
+        return IVFState(centroids, self._assign(centroids, matrix))
+
+    def update(self, state, matrix, keep, new_matrix):
+        """
+        Perbarui state IVF setelah delta galeri tanpa melatih ulang centroid
+
+        Args:
+            state: IVFState sebelumnya
+            matrix: Matriks galeri baru (baris lama yang dipertahankan + baris baru)
+            keep: Mask boolean baris lama yang dipertahankan
+            new_matrix: Baris baru yang ditambahkan di akhir matriks
+        """
+        if state is None:
+            return self.build(matrix)
+
+        assignments = np.concatenate([
+            state.assignments[keep], self._assign(state.centroids, new_matrix)
+        ])
+        return IVFState(state.centroids, assignments)
+
+    def candidates(self, state, query):
+        """
+        Returns:
+            Array index baris di nprobe cluster terdekat (terurut),
+            atau None jika state belum tersedia (semua baris)
+        """
+        if state is None:
+            return None
+
+        nprobe = min(self.nprobe, state.centroids.shape[0])
+        probe = np.argpartition(-(state.centroids @ query), nprobe - 1)[:nprobe]
+        rows = [state.order[state.offsets[c]:state.offsets[c + 1]] for c in probe]
+        return np.sort(np.concatenate(rows))
+
+
+def create_index(config=None):
+    """
+    Buat backend indeks galeri berdasarkan konfigurasi
+
+    Args:
+        config: Mapping konfigurasi Flask (app.config) atau None
+
+    Returns:
+        ExactIndex atau IVFIndex
+    """
+    config = config or {}
+    backend = (config.get('GALLERY_INDEX_BACKEND') or 'exact').lower()
+
+    if backend == 'exact':
+        return ExactIndex()
+    if backend == 'ivf':
+        return IVFIndex(
+            nlist=int(config.get('IVF_NLIST', 64)),
+            nprobe=int(config.get('IVF_NPROBE', 8)),
+            path=config.get('GALLERY_INDEX_PATH'),
+            train_iters=int(config.get('IVF_TRAIN_ITERS', 15))
+        )
+
+    raise ValueError(f"Unknown GALLERY_INDEX_BACKEND: {backend}")
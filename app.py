@@ -14,6 +14,63 @@ from werkzeug.utils import secure_filename
 from config import config_by_name
 from models import db, Users, VektorWajah, Absensi, JadwalPiket, PeriodePiket
 from face_recognition import FaceRecognitionService
+from face_templates import rebuild_user_templates
+from gallery import vector_columns
+from kiosk_stream import send_json, stream_recognition
+
+
+# Content-Type body gambar mentah (tanpa base64)
+RAW_IMAGE_MIMETYPES = ('image/jpeg', 'image/png', 'image/webp', 'application/octet-stream')
+
+
+# Pesan check-in jika wajah tidak bisa dipakai untuk pencocokan
+CHECKIN_FACE_MESSAGES = {
+    'decode_error': 'Gagal mendekode gambar',
+    'no_face': 'Tidak ada wajah terdeteksi dalam gambar',
+    'low_quality': 'Foto kurang jelas. Pastikan wajah terlihat jelas dan cukup cahaya.',
+}
+
+
+def get_request_data(image_field):
+    """
+    Baca body request sebagai dict dengan format yang sama seperti JSON
+    
+    Format yang didukung:
+        application/json    : gambar base64 di field image_field (seperti semula)
+        multipart/form-data : file gambar di field image_field (boleh berulang
+                              untuk 'images'), field lain sebagai form field
+        image/jpeg, ...     : body = satu file gambar, field lain di query string
+    
+    Untuk multipart dan raw, gambar dikembalikan sebagai bytes file yang
+    langsung di-decode tanpa round trip base64.
+    
+    Args:
+        image_field: 'image' (satu gambar) atau 'images' (list gambar)
+        
+    Returns:
+        Dict data request atau None jika body kosong
+    """
+    multiple = image_field == 'images'
+    
+    if request.mimetype == 'multipart/form-data':
+        data = request.form.to_dict()
+        files = [f.read() for f in request.files.getlist(image_field)]
+        files = [content for content in files if content]
+        if multiple:
+            data[image_field] = files
+        elif files:
+            data[image_field] = files[0]
+        return data
+    
+    if request.mimetype in RAW_IMAGE_MIMETYPES:
+        body = request.get_data(cache=False)
+        if not body:
+            return None
+        data = request.args.to_dict()
+        data[image_field] = [body] if multiple else body
+        return data
+    
+    return request.get_json()
 
 
 def create_app(config_name='development'):
@@ -26,13 +83,32 @@ def create_app(config_name='development'):
     CORS(app)
     
     # Initialize face recognition service
-    face_service = FaceRecognitionService()
+    face_service = FaceRecognitionService(app.config)
+    
+    # Petakan snapshot galeri bersama agar worker tidak perlu memuat vektor_wajah
+    face_service.gallery.load_snapshot()
     
     # Create tables
     with app.app_context():
         db.create_all()
         print("Database tables created successfully!")
     
+    # Muat FaceNet + warmup + galeri di background; /health/ready baru
+    # mengembalikan 200 setelah model siap dan galeri dimuat. Galeri yang
+    # gagal dimuat (mis. database sementara tidak bisa diakses) dicoba ulang
+    # di background, oleh /health/ready dan lazy di setiap request.
+    if app.config.get('FACE_WARMUP_ON_START', True):
+        def load_gallery():
+            with app.app_context():
+                try:
+                    face_service.gallery.sync(db.session)
+                finally:
+                    db.session.remove()
+        
+        face_service.start_warmup(after=load_gallery)
+    else:
+        face_service.ready.set()
+    
     # =========================================================================
     # ENDPOINT 1: Health Check
     # =========================================================================
@@ -56,10 +132,63 @@ def create_app(config_name='development'):
             'status': 'ok',
             'message': 'API Piket is running',
             'database': db_status,
+            'model': face_service.model_status,
             'timestamp': datetime.now().isoformat(),
             'version': '3.0'
         }), 200
     
+    @app.route('/health/live', methods=['GET'])
+    def health_live():
+        """
+        Liveness probe: proses hidup dan bisa menjawab request
+        (tidak mengecek model maupun database)
+        
+        Returns:
+            JSON response status alive
+        """
+        return jsonify({
+            'status': 'alive',
+            'timestamp': datetime.now().isoformat()
+        }), 200
+    
+    @app.route('/health/ready', methods=['GET'])
+    def health_ready():
+        """
+        Readiness probe: model FaceNet sudah dimuat dan di-warmup, galeri
+        wajah sudah dimuat dan database dapat diakses. Load balancer hanya
+        mengarahkan check-in ke worker yang mengembalikan 200. Galeri yang
+        belum dimuat setelah model siap dicoba dimuat di sini.
+        
+        Returns:
+            JSON response status ready (200) atau not_ready (503)
+        """
+        try:
+            db.session.execute(db.text('SELECT 1'))
+            db_status = 'connected'
+        except Exception as e:
+            db_status = f'error: {str(e)}'
+        
+        gallery_error = None
+        if face_service.ready.is_set() and db_status == 'connected' and not face_service.gallery.loaded:
+            try:
+                face_service.gallery.sync(db.session)
+            except Exception as e:
+                gallery_error = str(e)
+        
+        ready = face_service.ready.is_set() and db_status == 'connected' and face_service.gallery.loaded
+        
+        return jsonify({
+            'status': 'ready' if ready else 'not_ready',
+            'model': face_service.model_status,
+            'model_error': face_service.model_error,
+            'model_timings': face_service.model_timings,
+            'database': db_status,
+            'gallery': 'loaded' if face_service.gallery.loaded else 'not_loaded',
+            'gallery_error': gallery_error,
+            'gallery_size': face_service.gallery.size,
+            'timestamp': datetime.now().isoformat()
+        }), 200 if ready else 503
+    
     # =========================================================================
     # ENDPOINT 2: Insert Vektor Wajah dari Kamera (Multiple Images)
     # =========================================================================
@@ -74,12 +203,14 @@ def create_app(config_name='development'):
                 "user_id": "uuid-string",
                 "images": ["base64_image1", "base64_image2", ...] // max 20 images
             }
+            atau multipart/form-data (user_id + file 'images' berulang)
+            atau body image/jpeg dengan ?user_id=... (satu gambar)
         
         Returns:
             JSON response dengan status dan data yang tersimpan
         """
         try:
-            data = request.get_json()
+            data = get_request_data('images')
             
             # Validasi input
             if not data:
@@ -129,38 +260,39 @@ def create_app(config_name='development'):
             # Process setiap gambar dan extract embedding
             embeddings_saved = 0
             errors = []
+            skipped = []
             
-            for idx, img_base64 in enumerate(images, 1):
-                try:
-                    # Decode base64 image
-                    img = face_service.decode_base64_image(img_base64)
-                    if img is None:
-                        errors.append(f"Image {idx}: Failed to decode")
-                        continue
-                    
-                    # Extract embedding
-                    embedding = face_service.extract_embedding(img)
-                    if embedding is None:
-                        errors.append(f"Image {idx}: No face detected")
-                        continue
-                    
-                    # Simpan vektor ke database
-                    vektor_wajah = VektorWajah(
-                        user_id=user_id,
-                        vektor=embedding.tolist()  # Convert numpy array to list for JSON
-                    )
-                    db.session.add(vektor_wajah)
-                    embeddings_saved += 1
-                    
-                    print(f"✓ Image {idx}/{len(images)}: Embedding saved")
-                    
-                except Exception as e:
-                    errors.append(f"Image {idx}: {str(e)}")
-                    print(f"✗ Image {idx}/{len(images)}: Error - {str(e)}")
+            # Buang frame hampir identik, embed sisanya dalam satu batch,
+            # lalu buang embedding duplikat
+            results = face_service.extract_enrollment_embeddings(images)
+            
+            for idx, (embedding, error, skip_reason) in enumerate(results, 1):
+                if error is not None:
+                    errors.append(f"Image {idx}: {error}")
+                    print(f"✗ Image {idx}/{len(images)}: Error - {error}")
+                    continue
+                
+                if skip_reason is not None:
+                    skipped.append(f"Image {idx}: {skip_reason}")
+                    print(f"- Image {idx}/{len(images)}: Skipped - {skip_reason}")
+                    continue
+                
+                # Simpan vektor ke database
+                vektor_wajah = VektorWajah(
+                    user_id=user_id,
+                    **vector_columns(embedding, app.config)
+                )
+                db.session.add(vektor_wajah)
+                embeddings_saved += 1
+                
+                print(f"✓ Image {idx}/{len(images)}: Embedding saved")
             
             # Commit ke database
             if embeddings_saved > 0:
+                rebuild_user_templates(db.session, user_id, app.config)
+                face_service.gallery.record_change(db.session, user_id)
                 db.session.commit()
+                face_service.gallery.publish(db.session)
                 
                 return jsonify({
                     'success': True,
@@ -170,7 +302,8 @@ def create_app(config_name='development'):
                         'name': user.name,
                         'total_images_processed': len(images),
                         'embeddings_saved': embeddings_saved,
-                        'errors': errors if errors else None
+                        'errors': errors if errors else None,
+                        'skipped': skipped if skipped else None
                     }
                 }), 201
             else:
@@ -178,7 +311,8 @@ def create_app(config_name='development'):
                 return jsonify({
                     'success': False,
                     'message': 'Failed to extract any valid face embeddings',
-                    'errors': errors
+                    'errors': errors,
+                    'skipped': skipped if skipped else None
                 }), 400
                 
         except Exception as e:
@@ -208,12 +342,14 @@ def create_app(config_name='development'):
             {
                 "images": ["base64_image1", "base64_image2", ...] // max 20 images
             }
+            atau multipart/form-data (file 'images' berulang)
+            atau body image/jpeg (satu gambar)
         
         Returns:
             JSON response dengan status update
         """
         try:
-            data = request.get_json()
+            data = get_request_data('images')
             
             if not data:
                 return jsonify({
@@ -255,38 +391,39 @@ def create_app(config_name='development'):
             # Process gambar baru dan extract embedding
             embeddings_saved = 0
             errors = []
+            skipped = []
             
-            for idx, img_base64 in enumerate(images, 1):
-                try:
-                    # Decode base64 image
-                    img = face_service.decode_base64_image(img_base64)
-                    if img is None:
-                        errors.append(f"Image {idx}: Failed to decode")
-                        continue
-                    
-                    # Extract embedding
-                    embedding = face_service.extract_embedding(img)
-                    if embedding is None:
-                        errors.append(f"Image {idx}: No face detected")
-                        continue
-                    
-                    # Simpan vektor baru ke database
-                    vektor_wajah = VektorWajah(
-                        user_id=user_id,
-                        vektor=embedding.tolist()
-                    )
-                    db.session.add(vektor_wajah)
-                    embeddings_saved += 1
-                    
-                    print(f"✓ Image {idx}/{len(images)}: New embedding saved")
-                    
-                except Exception as e:
-                    errors.append(f"Image {idx}: {str(e)}")
-                    print(f"✗ Image {idx}/{len(images)}: Error - {str(e)}")
+            # Buang frame hampir identik, embed sisanya dalam satu batch,
+            # lalu buang embedding duplikat
+            results = face_service.extract_enrollment_embeddings(images)
+            
+            for idx, (embedding, error, skip_reason) in enumerate(results, 1):
+                if error is not None:
+                    errors.append(f"Image {idx}: {error}")
+                    print(f"✗ Image {idx}/{len(images)}: Error - {error}")
+                    continue
+                
+                if skip_reason is not None:
+                    skipped.append(f"Image {idx}: {skip_reason}")
+                    print(f"- Image {idx}/{len(images)}: Skipped - {skip_reason}")
+                    continue
+                
+                # Simpan vektor baru ke database
+                vektor_wajah = VektorWajah(
+                    user_id=user_id,
+                    **vector_columns(embedding, app.config)
+                )
+                db.session.add(vektor_wajah)
+                embeddings_saved += 1
+                
+                print(f"✓ Image {idx}/{len(images)}: New embedding saved")
             
             # Commit ke database
             if embeddings_saved > 0:
+                rebuild_user_templates(db.session, user_id, app.config)
+                face_service.gallery.record_change(db.session, user_id)
                 db.session.commit()
+                face_service.gallery.publish(db.session)
                 
                 return jsonify({
                     'success': True,
@@ -297,7 +434,8 @@ def create_app(config_name='development'):
                         'old_vectors_count': old_count,
                         'new_vectors_count': embeddings_saved,
                         'total_images_processed': len(images),
-                        'errors': errors if errors else None
+                        'errors': errors if errors else None,
+                        'skipped': skipped if skipped else None
                     }
                 }), 200
             else:
@@ -305,7 +443,8 @@ def create_app(config_name='development'):
                 return jsonify({
                     'success': False,
                     'message': 'Failed to extract any valid face embeddings',
-                    'errors': errors
+                    'errors': errors,
+                    'skipped': skipped if skipped else None
                 }), 400
                 
         except Exception as e:
@@ -319,6 +458,160 @@ def create_app(config_name='development'):
                 'message': f'Internal server error: {str(e)}'
             }), 500
     
+    # =========================================================================
+    # Logika check-in bersama (HTTP dan stream kiosk)
+    # =========================================================================
+    
+    def recognize_checkin_face(image):
+        """
+        Embedding + pencocokan 1:N untuk check-in
+        
+        Args:
+            image: Base64 string atau bytes gambar dari request; di-decode
+                   di dalam pipeline sehingga cache embedding bisa melewati
+                   decode untuk gambar yang sama
+        
+        Returns:
+            Tuple (match_result, reason) dengan reason 'decode_error', 'no_face',
+            'low_quality', 'not_recognized' atau None jika wajah dikenali
+        """
+        embedding, error = face_service.extract_embeddings_batch([image])[0]
+        if embedding is None:
+            if error == 'Failed to decode':
+                return None, 'decode_error'
+            if error and error.startswith('Low quality'):
+                print(f"✗ {error}")
+                return None, 'low_quality'
+            return None, 'no_face'
+        
+        match_result = face_service.find_best_match_from_db(
+            embedding, 
+            db.session, 
+            threshold=float(os.getenv('SIMILARITY_THRESHOLD', 0.7))
+        )
+        if not match_result:
+            return None, 'not_recognized'
+        return match_result, None
+    
+    def start_piket(match_result):
+        """
+        Buat absensi (jam masuk) untuk user yang dikenali
+        
+        Returns:
+            Tuple (payload, status_code)
+        """
+        user_id = match_result['user_id']
+        user_name = match_result['name']
+        similarity = match_result['similarity']
+        
+        # Get jadwal piket user - WAJIB ada
+        jadwal_piket = JadwalPiket.query.filter_by(user_id=user_id).first()
+        if not jadwal_piket:
+            return {
+                'success': False,
+                'message': f'{user_name} tidak memiliki jadwal piket'
+            }, 400
+        
+        # Cek apakah user sudah mulai piket hari ini
+        today = date.today()
+        existing_absensi = Absensi.query_with_user().filter_by(
+            jadwal_piket=jadwal_piket.id,
+            tanggal=today
+        ).first()
+        
+        if existing_absensi and existing_absensi.jam_masuk:
+            return {
+                'success': False,
+                'message': f'{user_name} sudah mulai piket hari ini',
+                'data': existing_absensi.to_dict()
+            }, 409
+        
+        # Get periode piket aktif
+        periode_aktif = PeriodePiket.query.filter_by(isactive=True).first()
+        if not periode_aktif:
+            return {
+                'success': False,
+                'message': 'Tidak ada periode piket aktif'
+            }, 400
+        
+        # Buat record absensi baru
+        absensi_id = str(uuid.uuid4())
+        absensi = Absensi(
+            id=absensi_id,
+            tanggal=today,
+            jam_masuk=datetime.now().time(),
+            foto='',
+            jadwal_piket=jadwal_piket.id,
+            kegiatan='',
+            periode_piket_id=periode_aktif.id
+        )
+        
+        db.session.add(absensi)
+        db.session.commit()
+        
+        result = absensi.to_dict(user_id=user_id, name=user_name)
+        result['similarity'] = similarity
+        
+        return {
+            'success': True,
+            'message': f'Piket dimulai untuk {user_name}',
+            'data': result
+        }, 201
+    
+    def finish_piket(match_result, kegiatan):
+        """
+        Isi jam keluar dan kegiatan absensi hari ini untuk user yang dikenali
+        
+        Returns:
+            Tuple (payload, status_code)
+        """
+        user_id = match_result['user_id']
+        user_name = match_result['name']
+        similarity = match_result['similarity']
+        
+        # Get jadwal piket user
+        jadwal_piket = JadwalPiket.query.filter_by(user_id=user_id).first()
+        if not jadwal_piket:
+            return {
+                'success': False,
+                'message': f'{user_name} tidak memiliki jadwal piket'
+            }, 400
+        
+        # Cek apakah user sudah mulai piket hari ini
+        today = date.today()
+        absensi = Absensi.query_with_user().filter_by(
+            jadwal_piket=jadwal_piket.id,
+            tanggal=today
+        ).first()
+        
+        if not absensi:
+            return {
+                'success': False,
+                'message': f'{user_name} belum mulai piket hari ini'
+            }, 400
+        
+        if absensi.jam_keluar:
+            return {
+                'success': False,
+                'message': f'{user_name} sudah mengakhiri piket hari ini',
+                'data': absensi.to_dict()
+            }, 409
+        
+        # Update absensi dengan jam keluar dan kegiatan
+        absensi.jam_keluar = datetime.now().time()
+        absensi.kegiatan = kegiatan
+        
+        db.session.commit()
+        
+        result = absensi.to_dict(user_id=user_id, name=user_name)
+        result['similarity'] = similarity
+        
+        return {
+            'success': True,
+            'message': f'Piket selesai untuk {user_name}',
+            'data': result
+        }, 200
+    
     # =========================================================================
     # ENDPOINT 4: Mulai Piket (Real-time Face Recognition)
     # =========================================================================
@@ -332,12 +625,13 @@ def create_app(config_name='development'):
             {
                 "image": "base64_image_string"
             }
+            atau multipart/form-data (file 'image') atau body image/jpeg
         
         Returns:
             JSON response dengan data absensi yang dibuat
         """
         try:
-            data = request.get_json()
+            data = get_request_data('image')
             
             if not data:
                 return jsonify({
@@ -345,100 +639,31 @@ def create_app(config_name='development'):
                     'message': 'Tidak ada data yang disediakan.'
                 }), 400
             
-            img_base64 = data.get('image')
+            image = data.get('image')
             
-            if not img_base64:
+            if not image:
                 return jsonify({
                     'success': False,
                     'message': 'Gambar diperlukan'
                 }), 400
             
-            # Decode image
-            img = face_service.decode_base64_image(img_base64)
-            if img is None:
+            # Decode + extract embedding + cari match dari database
+            # (base64 dari JSON atau bytes dari multipart/raw)
+            match_result, reason = recognize_checkin_face(image)
+            if reason in CHECKIN_FACE_MESSAGES:
                 return jsonify({
                     'success': False,
-                    'message': 'Gagal mendekode gambar'
+                    'message': CHECKIN_FACE_MESSAGES[reason]
                 }), 400
             
-            # Extract embedding
-            embedding = face_service.extract_embedding(img)
-            if embedding is None:
-                return jsonify({
-                    'success': False,
-                    'message': 'Tidak ada wajah terdeteksi dalam gambar'
-                }), 400
-            
-            # Cari match dari database
-            match_result = face_service.find_best_match_from_db(
-                embedding, 
-                db.session, 
-                threshold=float(os.getenv('SIMILARITY_THRESHOLD', 0.7))
-            )
-            
             if not match_result:
                 return jsonify({
                     'success': False,
                     'message': 'Wajah tidak dikenali. Silakan daftar terlebih dahulu.'
                 }), 404
             
-            user_id = match_result['user_id']
-            user_name = match_result['name']
-            similarity = match_result['similarity']
-            
-            # Get jadwal piket user - WAJIB ada
-            jadwal_piket = JadwalPiket.query.filter_by(user_id=user_id).first()
-            if not jadwal_piket:
-                return jsonify({
-                    'success': False,
-                    'message': f'{user_name} tidak memiliki jadwal piket'
-                }), 400
-            
-            # Cek apakah user sudah mulai piket hari ini
-            today = date.today()
-            existing_absensi = Absensi.query.filter_by(
-                jadwal_piket=jadwal_piket.id,
-                tanggal=today
-            ).first()
-            
-            if existing_absensi and existing_absensi.jam_masuk:
-                return jsonify({
-                    'success': False,
-                    'message': f'{user_name} sudah mulai piket hari ini',
-                    'data': existing_absensi.to_dict()
-                }), 409
-            
-            # Get periode piket aktif
-            periode_aktif = PeriodePiket.query.filter_by(isactive=True).first()
-            if not periode_aktif:
-                return jsonify({
-                    'success': False,
-                    'message': 'Tidak ada periode piket aktif'
-                }), 400
-            
-            # Buat record absensi baru
-            absensi_id = str(uuid.uuid4())
-            absensi = Absensi(
-                id=absensi_id,
-                tanggal=today,
-                jam_masuk=datetime.now().time(),
-                foto='',
-                jadwal_piket=jadwal_piket.id,
-                kegiatan='',
-                periode_piket_id=periode_aktif.id
-            )
-            
-            db.session.add(absensi)
-            db.session.commit()
-            
-            result = absensi.to_dict()
-            result['similarity'] = similarity
-            
-            return jsonify({
-                'success': True,
-                'message': f'Piket dimulai untuk {user_name}',
-                'data': result
-            }), 201
+            payload, status = start_piket(match_result)
+            return jsonify(payload), status
             
         except Exception as e:
             db.session.rollback()
@@ -465,12 +690,14 @@ def create_app(config_name='development'):
                 "image": "base64_image_string",
                 "kegiatan": "Deskripsi kegiatan selama piket"
             }
+            atau multipart/form-data (file 'image' + field kegiatan)
+            atau body image/jpeg dengan ?kegiatan=...
         
         Returns:
             JSON response dengan data absensi yang diupdate
         """
         try:
-            data = request.get_json()
+            data = get_request_data('image')
             
             if not data:
                 return jsonify({
@@ -478,10 +705,10 @@ def create_app(config_name='development'):
                     'message': 'Data tidak disediakan'
                 }), 400
             
-            img_base64 = data.get('image')
+            image = data.get('image')
             kegiatan = data.get('kegiatan', '').strip()
             
-            if not img_base64:
+            if not image:
                 return jsonify({
                     'success': False,
                     'message': 'Gambar diperlukan'
@@ -493,81 +720,23 @@ def create_app(config_name='development'):
                     'message': 'kegiatan is required'
                 }), 400
             
-            # Decode image
-            img = face_service.decode_base64_image(img_base64)
-            if img is None:
-                return jsonify({
-                    'success': False,
-                    'message': 'Gagal mendekode gambar'
-                }), 400
-            
-            # Extract embedding
-            embedding = face_service.extract_embedding(img)
-            if embedding is None:
+            # Decode + extract embedding + cari match dari database
+            # (base64 dari JSON atau bytes dari multipart/raw)
+            match_result, reason = recognize_checkin_face(image)
+            if reason in CHECKIN_FACE_MESSAGES:
                 return jsonify({
                     'success': False,
-                    'message': 'Tidak ada wajah terdeteksi dalam gambar'
+                    'message': CHECKIN_FACE_MESSAGES[reason]
                 }), 400
             
-            # Cari match dari database
-            match_result = face_service.find_best_match_from_db(
-                embedding, 
-                db.session, 
-                threshold=float(os.getenv('SIMILARITY_THRESHOLD', 0.7))
-            )
-            
             if not match_result:
                 return jsonify({
                     'success': False,
                     'message': 'Wajah tidak dikenali. Silakan coba lagi.'
                 }), 404
             
-            user_id = match_result['user_id']
-            user_name = match_result['name']
-            similarity = match_result['similarity']
-            
-            # Get jadwal piket user
-            jadwal_piket = JadwalPiket.query.filter_by(user_id=user_id).first()
-            if not jadwal_piket:
-                return jsonify({
-                    'success': False,
-                    'message': f'{user_name} tidak memiliki jadwal piket'
-                }), 400
-            
-            # Cek apakah user sudah mulai piket hari ini
-            today = date.today()
-            absensi = Absensi.query.filter_by(
-                jadwal_piket=jadwal_piket.id,
-                tanggal=today
-            ).first()
-            
-            if not absensi:
-                return jsonify({
-                    'success': False,
-                    'message': f'{user_name} belum mulai piket hari ini'
-                }), 400
-            
-            if absensi.jam_keluar:
-                return jsonify({
-                    'success': False,
-                    'message': f'{user_name} sudah mengakhiri piket hari ini',
-                    'data': absensi.to_dict()
-                }), 409
-            
-            # Update absensi dengan jam keluar dan kegiatan
-            absensi.jam_keluar = datetime.now().time()
-            absensi.kegiatan = kegiatan
-            
-            db.session.commit()
-            
-            result = absensi.to_dict()
-            result['similarity'] = similarity
-            
-            return jsonify({
-                'success': True,
-                'message': f'Piket selesai untuk {user_name}',
-                'data': result
-            }), 200
+            payload, status = finish_piket(match_result, kegiatan)
+            return jsonify(payload), status
             
         except Exception as e:
             db.session.rollback()
@@ -630,16 +799,15 @@ def create_app(config_name='development'):
                     'message': f'User with id {user_id} not found'
                 }), 404
             
-            # Decode image
-            img = face_service.decode_base64_image(img_base64)
-            if img is None:
+            # Decode + extract embedding (di-cache per isi gambar, request
+            # ulang dengan foto yang sama tidak menjalankan FaceNet lagi)
+            embedding, error = face_service.extract_embeddings_batch([img_base64])[0]
+            if error == 'Failed to decode':
                 return jsonify({
                     'success': False,
                     'message': 'Failed to decode image'
                 }), 400
             
-            # Extract embedding
-            embedding = face_service.extract_embedding(img)
             if embedding is None:
                 return jsonify({
                     'success': False,
@@ -649,10 +817,13 @@ def create_app(config_name='development'):
             # Simpan vektor ke database
             vektor_wajah = VektorWajah(
                 user_id=user_id,
-                vektor=embedding.tolist()
+                **vector_columns(embedding, app.config)
             )
             db.session.add(vektor_wajah)
+            rebuild_user_templates(db.session, user_id, app.config)
+            face_service.gallery.record_change(db.session, user_id)
             db.session.commit()
+            face_service.gallery.publish(db.session)
             
             # Hitung total vektor yang dimiliki user
             total_vectors = VektorWajah.query.filter_by(user_id=user_id).count()
@@ -679,6 +850,202 @@ def create_app(config_name='development'):
                 'message': f'Internal server error: {str(e)}'
             }), 500
     
+    # =========================================================================
+    # ENDPOINT 7: Identifikasi Top-K (Diagnostik)
+    # =========================================================================
+    
+    if app.config.get('ENABLE_DIAGNOSTIC_ENDPOINTS'):
+        @app.route('/api/face/identify', methods=['POST'])
+        def identify_face():
+            """
+            Tampilkan k kandidat user teratas untuk satu gambar wajah beserta
+            keputusan threshold dan margin (tanpa mencatat absensi)
+            
+            Request Body:
+                {
+                    "image": "base64_image_string",
+                    "k": 5  // optional, default 5
+                }
+            
+            Returns:
+                JSON response dengan daftar kandidat dan keputusan match
+            """
+            try:
+                data = request.get_json()
+                
+                if not data or not data.get('image'):
+                    return jsonify({
+                        'success': False,
+                        'message': 'image is required'
+                    }), 400
+                
+                try:
+                    k = max(1, min(int(data.get('k', 5)), 50))
+                except (TypeError, ValueError):
+                    return jsonify({
+                        'success': False,
+                        'message': 'k must be an integer'
+                    }), 400
+
+                img = face_service.decode_base64_image(data['image'])
+                if img is None:
+                    return jsonify({
+                        'success': False,
+                        'message': 'Failed to decode image'
+                    }), 400
+                
+                embedding = face_service.extract_embedding(img)
+                if embedding is None:
+                    return jsonify({
+                        'success': False,
+                        'message': 'No face detected in image'
+                    }), 400
+                
+                candidates = face_service.find_top_matches_from_db(embedding, db.session, k=max(k, 2))
+                threshold = float(os.getenv('SIMILARITY_THRESHOLD', 0.7))
+                margin = float(app.config.get('FACE_MATCH_MARGIN', 0.0))
+                accepted, reason = face_service.check_match(candidates, threshold, margin)
+                
+                gap = None
+                if len(candidates) > 1:
+                    gap = candidates[0]['similarity'] - candidates[1]['similarity']
+                
+                return jsonify({
+                    'success': True,
+                    'data': {
+                        'candidates': candidates[:k],
+                        'threshold': threshold,
+                        'margin': margin,
+                        'top1_top2_gap': gap,
+                        'accepted': accepted,
+                        'decision': reason
+                    }
+                }), 200
+                
+            except Exception as e:
+                print(f"Error in identify_face: {str(e)}")
+                import traceback
+                traceback.print_exc()
+                
+                return jsonify({
+                    'success': False,
+                    'message': f'Internal server error: {str(e)}'
+                }), 500
+    
+    # =========================================================================
+    # ENDPOINT 8: Statistik Internal (Diagnostik)
+    # =========================================================================
+    
+    if app.config.get('ENABLE_DIAGNOSTIC_ENDPOINTS'):
+        @app.route('/api/internal/stats', methods=['GET'])
+        def internal_stats():
+            """
+            Statistik internal worker ini untuk tuning (antrian micro-batch
+            FaceNet, cache embedding, pool koneksi database dan ukuran galeri)
+            
+            Returns:
+                JSON response dengan statistik per worker
+            """
+            scheduler = face_service.scheduler
+            embedding_cache = face_service.embedding_cache
+            pool = db.engine.pool
+            return jsonify({
+                'success': True,
+                'data': {
+                    'pid': os.getpid(),
+                    'inference': scheduler.stats() if scheduler else None,
+                    'embedding_cache': embedding_cache.stats() if embedding_cache else None,
+                    'db_pool': pool.stats() if hasattr(pool, 'stats') else {'status': pool.status()},
+                    'gallery': {
+                        'size': face_service.gallery.size,
+                        'version': face_service.gallery.version
+                    }
+                }
+            }), 200
+    
+    # =========================================================================
+    # ENDPOINT 9: Stream Kiosk (WebSocket, opsional flask-sock)
+    # =========================================================================
+    
+    if app.config.get('KIOSK_STREAM_ENABLED', True):
+        try:
+            from flask_sock import Sock
+            from simple_websocket import ConnectionClosed
+        except ImportError:
+            Sock = None
+            print("flask-sock not installed; kiosk stream endpoints /ws/piket/* disabled")
+        
+        if Sock is not None:
+            sock = Sock(app)
+            
+            def recognize_stream_frame(frame):
+                """Decode + recognize satu frame kiosk (bytes JPEG atau base64)"""
+                try:
+                    return recognize_checkin_face(frame)
+                finally:
+                    # Jangan tahan transaksi database selama sesi stream
+                    db.session.remove()
+            
+            def run_kiosk_stream(ws, on_match, endpoint):
+                """Jalankan sesi stream dengan logika check-in on_match"""
+                try:
+                    result = stream_recognition(
+                        ws,
+                        recognize_stream_frame,
+                        on_match,
+                        timeout=float(app.config.get('KIOSK_STREAM_TIMEOUT', 15.0)),
+                        confirm_frames=int(app.config.get('KIOSK_STREAM_CONFIRM_FRAMES', 1))
+                    )
+                    print(f"Kiosk stream {endpoint}: {result['status']} after {result['frames']} frames "
+                          f"({result['dropped']} dropped)")
+                except ConnectionClosed:
+                    # Kiosk menutup koneksi sebelum keputusan
+                    pass
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error in kiosk stream {endpoint}: {str(e)}")
+                    import traceback
+                    traceback.print_exc()
+                    
+                    send_json(ws, {
+                        'type': 'result',
+                        'status': 500,
+                        'success': False,
+                        'message': f'Internal server error: {str(e)}'
+                    })
+            
+            @sock.route('/ws/piket/mulai')
+            def mulai_piket_stream(ws):
+                """
+                Mulai piket lewat stream frame kamera
+                
+                Kiosk mengirim frame (JPEG biner atau base64) terus menerus;
+                server membalas progress per frame yang diproses dan satu
+                pesan result (payload sama dengan POST /api/piket/mulai)
+                begitu wajah dikenali atau KIOSK_STREAM_TIMEOUT habis.
+                """
+                run_kiosk_stream(ws, start_piket, 'mulai')
+            
+            @sock.route('/ws/piket/akhiri')
+            def akhiri_piket_stream(ws):
+                """
+                Akhiri piket lewat stream frame kamera
+                
+                Query string:
+                    kegiatan: Deskripsi kegiatan selama piket (wajib)
+                """
+                kegiatan = request.args.get('kegiatan', '').strip()
+                if not kegiatan:
+                    send_json(ws, {
+                        'type': 'result',
+                        'status': 400,
+                        'success': False,
+                        'message': 'kegiatan is required'
+                    })
+                    return
+                
+                run_kiosk_stream(ws, lambda match_result: finish_piket(match_result, kegiatan), 'akhiri')
+    
     # =========================================================================
     # Error Handlers
     # =========================================================================
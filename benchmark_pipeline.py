@@ -0,0 +1,134 @@
+"""
+Script benchmark pipeline deteksi + embedding per request
+
+Membandingkan FACE_DETECTOR_MODE:
+    haar_mtcnn : Haar cascade lalu MTCNN keras-facenet pada crop (deteksi dua kali)
+    haar       : kotak Haar langsung di-align ke input FaceNet (deteksi sekali)
+
+Untuk setiap gambar diukur waktu deteksi/crop dan forward pass FaceNet,
+serta cosine similarity embedding kedua mode (seberapa jauh embedding
+bergeser jika mode diganti tanpa registrasi ulang).
+
+Usage:
+    python benchmark_pipeline.py                      # foto di UPLOAD_FOLDER
+    python benchmark_pipeline.py --images foto/ --repeat 5
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from flask import Flask
+
+from config import config_by_name
+from face_recognition import FaceRecognitionService
+from gallery import FaceGallery
+
+
+MODES = ('haar_mtcnn', 'haar')
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+
+def load_images(directory, limit):
+    """Baca gambar dari direktori (rekursif)"""
+    paths = sorted(p for p in Path(directory).rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+    images = []
+    for path in paths[:limit]:
+        img = cv2.imread(str(path))
+        if img is not None:
+            images.append((path.name, img))
+    return images
+
+
+def run_mode(service, mode, img, repeat):
+    """
+    Jalankan satu mode pada satu gambar
+
+    Returns:
+        Tuple (embedding, detect_ms, embed_ms) atau None jika wajah tidak terdeteksi
+    """
+    service.preprocessor.detector_mode = mode
+    detect_times = []
+    embed_times = []
+    embedding = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        face = service.detect_face_crop(img)
+        detect_times.append(time.perf_counter() - start)
+        if face is None:
+            return None
+
+        start = time.perf_counter()
+        embedding = service.embedder.embeddings([face])[0]
+        embed_times.append(time.perf_counter() - start)
+
+    return embedding, np.median(detect_times) * 1000, np.median(embed_times) * 1000
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Benchmark pipeline deteksi wajah')
+    parser.add_argument('--images', default=os.getenv('UPLOAD_FOLDER', 'data/wajah'),
+                        help='Direktori foto wajah')
+    parser.add_argument('--limit', type=int, default=50, help='Jumlah gambar maksimal')
+    parser.add_argument('--repeat', type=int, default=3, help='Pengulangan per gambar (median)')
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        print(f"No images found in {args.images}")
+        return
+
+    app = Flask(__name__)
+    app.config.from_object(config_by_name[os.getenv('FLASK_ENV', 'development')])
+    service = FaceRecognitionService(app.config)
+
+    # Warmup agar inisialisasi graph TensorFlow tidak ikut terukur
+    for mode in MODES:
+        run_mode(service, mode, images[0][1], 1)
+
+    stats = {mode: {'detect': [], 'embed': [], 'missed': 0} for mode in MODES}
+    similarities = []
+
+    for name, img in images:
+        embeddings = {}
+        for mode in MODES:
+            result = run_mode(service, mode, img, args.repeat)
+            if result is None:
+                stats[mode]['missed'] += 1
+                continue
+            embeddings[mode], detect_ms, embed_ms = result
+            stats[mode]['detect'].append(detect_ms)
+            stats[mode]['embed'].append(embed_ms)
+
+        if len(embeddings) == len(MODES):
+            a, b = (FaceGallery.normalize(embeddings[mode]) for mode in MODES)
+            similarities.append(float(a @ b))
+
+    print(f"\n{len(images)} images, {args.repeat} repeats (median per image)")
+    print("-" * 72)
+    print(f"{'mode':<12}{'detect ms':>12}{'embed ms':>12}{'total ms':>12}{'no face':>10}")
+    print("-" * 72)
+    totals = {}
+    for mode in MODES:
+        detect = np.mean(stats[mode]['detect']) if stats[mode]['detect'] else float('nan')
+        embed = np.mean(stats[mode]['embed']) if stats[mode]['embed'] else float('nan')
+        totals[mode] = detect + embed
+        print(f"{mode:<12}{detect:>12.2f}{embed:>12.2f}{totals[mode]:>12.2f}{stats[mode]['missed']:>10}")
+    print("-" * 72)
+
+    saved = totals['haar_mtcnn'] - totals['haar']
+    print(f"Saved per request with FACE_DETECTOR_MODE=haar: {saved:.2f} ms "
+          f"({saved / totals['haar_mtcnn'] * 100:.1f}%)")
+    if similarities:
+        print(f"Cosine similarity haar vs haar_mtcnn embeddings: "
+              f"mean {np.mean(similarities):.3f}, min {np.min(similarities):.3f}")
+        print("Embeddings shift between modes; re-enroll users after switching modes "
+              "if the mean similarity is far below 1.0")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Script verifikasi index untuk query lookup utama API Piket
+
+Menjalankan EXPLAIN (MySQL) atau EXPLAIN QUERY PLAN (SQLite) untuk query
+yang dijalankan setiap check-in dan registrasi, lalu mengecek apakah
+optimizer memakai index yang dibuat migrasi 0003_lookup_indexes.
+
+Status per query:
+    OK      : optimizer memakai index yang kolom awalnya sama dengan kolom
+              di LOOKUP_INDEXES
+    WARN    : index tersebut ada tetapi optimizer memilih full scan atau
+              index lain (wajar untuk tabel yang masih sangat kecil, mis.
+              periode_piket)
+    FAILED  : tidak ada index untuk kolom tersebut, meskipun index lain
+              (mis. index foreign key jadwal_piket) dipakai (jalankan
+              migrate_db.py)
+
+Script keluar dengan status 1 jika ada query FAILED.
+
+Usage:
+    python check_indexes.py
+    python check_indexes.py --verbose     # tampilkan output EXPLAIN lengkap
+"""
+import argparse
+import sys
+from datetime import date
+
+from sqlalchemy import inspect, text
+
+from cli_app import create_cli_app
+from migrate_db import LOOKUP_INDEXES, has_index
+from models import db
+
+
+# (tabel, SQL query lookup, fungsi pengambil parameter contoh)
+HOT_QUERIES = {
+    'absensi': (
+        'SELECT * FROM absensi WHERE jadwal_piket = :jadwal_piket AND tanggal = :tanggal',
+        lambda conn: {
+            'jadwal_piket': _sample(conn, 'SELECT id FROM jadwal_piket LIMIT 1'),
+            'tanggal': date.today(),
+        },
+    ),
+    'vektor_wajah': (
+        'SELECT * FROM vektor_wajah WHERE user_id = :user_id',
+        lambda conn: {'user_id': _sample(conn, 'SELECT user_id FROM vektor_wajah LIMIT 1')},
+    ),
+    'jadwal_piket': (
+        'SELECT * FROM jadwal_piket WHERE user_id = :user_id',
+        lambda conn: {'user_id': _sample(conn, 'SELECT user_id FROM jadwal_piket LIMIT 1')},
+    ),
+    'periode_piket': (
+        'SELECT * FROM periode_piket WHERE isactive = :isactive',
+        lambda conn: {'isactive': True},
+    ),
+}
+
+
+def _sample(conn, sql):
+    """Nilai contoh dari database agar rencana query realistis"""
+    value = conn.execute(text(sql)).scalar()
+    return value if value is not None else '00000000-0000-0000-0000-000000000000'
+
+
+def index_columns(conn, table, name):
+    """Kolom index dengan nama tersebut (termasuk primary key), atau () jika tidak ditemukan"""
+    inspector = inspect(conn)
+    for index in inspector.get_indexes(table):
+        if index['name'] == name:
+            return tuple(index['column_names'])
+    primary = inspector.get_pk_constraint(table)
+    if name in ('PRIMARY', primary.get('name')):
+        return tuple(primary.get('constrained_columns') or ())
+    return ()
+
+
+def explain(conn, sql, params):
+    """
+    Jalankan EXPLAIN sesuai dialect
+
+    Returns:
+        Tuple (nama index yang dipakai atau None, baris output EXPLAIN)
+    """
+    if conn.dialect.name == 'sqlite':
+        rows = [row[-1] for row in conn.execute(text(f'EXPLAIN QUERY PLAN {sql}'), params)]
+        for detail in rows:
+            for marker in ('USING COVERING INDEX ', 'USING INDEX '):
+                if marker in detail:
+                    return detail.split(marker, 1)[1].split(' ', 1)[0], rows
+        return None, rows
+
+    if conn.dialect.name == 'mysql':
+        rows = [dict(row._mapping) for row in conn.execute(text(f'EXPLAIN {sql}'), params)]
+        keys = [row.get('key') for row in rows if row.get('key')]
+        return (keys[0] if keys else None), rows
+
+    raise ValueError(f"Unsupported dialect for EXPLAIN check: {conn.dialect.name}")
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Verifikasi index query lookup dengan EXPLAIN')
+    parser.add_argument('--verbose', action='store_true', help='Tampilkan output EXPLAIN lengkap')
+    args = parser.parse_args()
+
+    app = create_cli_app()
+
+    failed = 0
+    with app.app_context(), db.engine.connect() as conn:
+        print(f"\nIndex check ({conn.dialect.name})")
+        print("-" * 78)
+        for _, table, columns in LOOKUP_INDEXES:
+            sql, sample = HOT_QUERIES[table]
+            used, rows = explain(conn, sql, sample(conn))
+
+            if used and index_columns(conn, table, used)[:len(columns)] == tuple(columns):
+                status = 'OK'
+            elif has_index(conn, table, columns):
+                status = 'WARN'
+            else:
+                status = 'FAILED'
+                failed += 1
+
+            target = f"{table}({', '.join(columns)})"
+            print(f"{status:<8}{target:<40}index: {used or '-'}")
+            if args.verbose or status != 'OK':
+                for row in rows:
+                    print(f"          {row}")
+        print("-" * 78)
+
+    if failed:
+        print(f"✗ {failed} lookup(s) without index; run: python migrate_db.py")
+        sys.exit(1)
+    print("✓ All lookup columns are indexed")
+
+
+if __name__ == '__main__':
+    main()
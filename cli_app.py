@@ -0,0 +1,29 @@
+"""
+Modul CLI App - Flask app minimal untuk script command line
+
+Script migrasi, backfill, verifikasi index dan evaluasi hanya butuh config dan
+koneksi database, tanpa memuat FaceNet maupun mendaftarkan endpoint API.
+"""
+import os
+
+from flask import Flask
+
+from config import config_by_name
+from models import db
+
+
+def create_cli_app(config_name=None):
+    """
+    Buat Flask app minimal dengan config dan db.init_app
+
+    Args:
+        config_name: Nama config (default FLASK_ENV atau 'development')
+
+    Returns:
+        Flask app; jalankan query di dalam app.app_context()
+    """
+    app = Flask(__name__)
+    app.config.from_object(config_by_name[config_name or os.getenv('FLASK_ENV', 'development')])
+    app.config['SQLALCHEMY_ECHO'] = False
+    db.init_app(app)
+    return app
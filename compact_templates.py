@@ -0,0 +1,65 @@
+"""
+Script backfill template wajah (centroid + medoid) untuk user yang sudah
+memiliki vektor wajah di database
+
+Usage:
+    python compact_templates.py              # semua user yang belum punya template
+    python compact_templates.py --all        # hitung ulang semua user
+    python compact_templates.py --user-id <uuid>
+"""
+import argparse
+
+from cli_app import create_cli_app
+from models import db, TemplateWajah, VektorWajah
+from face_templates import rebuild_user_templates
+from gallery import FaceGallery
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Backfill template wajah per user')
+    parser.add_argument('--user-id', help='Hanya proses user tertentu')
+    parser.add_argument('--all', action='store_true', help='Hitung ulang user yang sudah punya template')
+    args = parser.parse_args()
+
+    app = create_cli_app()
+
+    with app.app_context():
+        db.create_all()
+
+        query = db.session.query(VektorWajah.user_id).distinct()
+        if args.user_id:
+            query = query.filter(VektorWajah.user_id == args.user_id)
+        elif not args.all:
+            query = query.filter(~VektorWajah.user_id.in_(
+                db.session.query(TemplateWajah.user_id).distinct()
+            ))
+        user_ids = [user_id for (user_id,) in query]
+
+        print("=" * 60)
+        print(f"Compacting face templates for {len(user_ids)} users")
+        print("=" * 60)
+
+        total_vectors = 0
+        total_templates = 0
+        for idx, user_id in enumerate(user_ids, 1):
+            try:
+                n_vectors = VektorWajah.query.filter_by(user_id=user_id).count()
+                n_templates = rebuild_user_templates(db.session, user_id, app.config)
+                FaceGallery.record_change(db.session, user_id)
+                db.session.commit()
+
+                total_vectors += n_vectors
+                total_templates += n_templates
+                print(f"✓ [{idx}/{len(user_ids)}] {user_id}: {n_vectors} vectors -> {n_templates} templates")
+            except Exception as e:
+                db.session.rollback()
+                print(f"✗ [{idx}/{len(user_ids)}] {user_id}: Error - {str(e)}")
+
+        if total_templates:
+            print(f"\nTotal: {total_vectors} vectors -> {total_templates} templates "
+                  f"({total_vectors / total_templates:.1f}x fewer comparisons)")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,31 @@ Konfigurasi Database untuk API Absen Piket
 """
 import os
 
+from db_pool import InstrumentedQueuePool
+
+
+def engine_options(pool_size, max_overflow):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS dari environment, dengan default ukuran pool
+    per kelas konfigurasi
+    
+    Args:
+        pool_size: Default DB_POOL_SIZE
+        max_overflow: Default DB_MAX_OVERFLOW
+    """
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': int(os.environ.get('DB_POOL_SIZE') or pool_size),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW') or max_overflow),
+        # Detik menunggu koneksi kosong sebelum request gagal
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT') or 10),
+        # Tutup koneksi yang lebih tua dari ini (di bawah wait_timeout MySQL/proxy)
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE') or 280),
+        # Cek koneksi sebelum dipakai agar koneksi MySQL yang sudah putus tidak gagal di request
+        'pool_pre_ping': (os.environ.get('DB_POOL_PRE_PING') or 'true').lower() == 'true',
+    }
+
+
 class Config:
     """Konfigurasi aplikasi"""
     
@@ -20,9 +45,128 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False  # Set True untuk debug SQL queries
+    # Pool koneksi: sebaiknya pool_size >= jumlah thread per worker gunicorn
+    # (--threads) ditambah sesi stream kiosk yang berjalan bersamaan
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=10, max_overflow=10)
     
     # Konfigurasi FaceNet
     FACE_RECOGNITION_THRESHOLD = float(os.environ.get('FACE_THRESHOLD') or 0.7)
+    # Selisih minimum similarity kandidat terbaik vs kedua (0 = nonaktif).
+    # Match dengan selisih lebih kecil dianggap ambigu dan ditolak.
+    FACE_MATCH_MARGIN = float(os.environ.get('FACE_MATCH_MARGIN') or 0.0)
+    # Aktifkan endpoint diagnostik /api/face/identify
+    ENABLE_DIAGNOSTIC_ENDPOINTS = (os.environ.get('ENABLE_DIAGNOSTIC_ENDPOINTS') or 'false').lower() == 'true'
+    # Pipeline deteksi wajah: 'haar_mtcnn' (Haar lalu MTCNN keras-facenet)
+    # atau 'haar' (kotak Haar langsung di-resize ke input FaceNet).
+    # Ukur selisihnya dengan: python benchmark_pipeline.py
+    FACE_DETECTOR_MODE = os.environ.get('FACE_DETECTOR_MODE') or 'haar_mtcnn'
+    # Margin kotak Haar (fraksi dari sisi wajah) pada mode 'haar'
+    FACE_CROP_MARGIN = float(os.environ.get('FACE_CROP_MARGIN') or 0.1)
+    # Deteksi Haar dijalankan pada salinan yang diperkecil hingga sisi
+    # terpanjang ROI oval <= FACE_DETECT_MAX_SIZE piksel (0 = resolusi penuh)
+    FACE_DETECT_MAX_SIZE = int(os.environ.get('FACE_DETECT_MAX_SIZE') or 640)
+    # Ukuran wajah minimal (piksel pada gambar asli)
+    FACE_MIN_SIZE = int(os.environ.get('FACE_MIN_SIZE') or 40)
+    # JPEG besar di-decode pada skala 1/2, 1/4 atau 1/8 selama sisi
+    # terpendeknya tetap >= FACE_DECODE_MIN_SIZE piksel (0 = selalu penuh)
+    FACE_DECODE_MIN_SIZE = int(os.environ.get('FACE_DECODE_MIN_SIZE') or 480)
+    # Jumlah resolusi kamera yang mask oval dan buffer kerjanya di-cache
+    # (0 = alokasi baru setiap request)
+    FACE_MASK_CACHE_SIZE = int(os.environ.get('FACE_MASK_CACHE_SIZE') or 4)
+    # Registrasi multi-frame: frame berurutan dengan selisih rata-rata grayscale
+    # 32x32 di bawah FRAME_DEDUP_THRESHOLD (0-255, 0 = nonaktif) dikelompokkan
+    # sebelum deteksi dan hanya satu kandidat per kelompok yang dideteksi dan
+    # diambil. Noise sensor saja
+    # sekitar 0.1 dan geser kepala 2px sekitar 0.2, sehingga nilai yang masuk
+    # akal hanya untuk frame beku/dikirim ulang (mis. 0.15). Embedding dengan
+    # cosine similarity >= EMBEDDING_DEDUP_SIMILARITY (1.0 = nonaktif) dilewati.
+    # Kedua tahap selalu menyisakan minimal FRAME_DEDUP_MIN_FRAMES frame.
+    FRAME_DEDUP_THRESHOLD = float(os.environ.get('FRAME_DEDUP_THRESHOLD') or 0.0)
+    EMBEDDING_DEDUP_SIMILARITY = float(os.environ.get('EMBEDDING_DEDUP_SIMILARITY') or 0.99)
+    FRAME_DEDUP_MIN_FRAMES = int(os.environ.get('FRAME_DEDUP_MIN_FRAMES') or 5)
+    # Quality gate sebelum FaceNet: crop wajah yang buram (variansi Laplacian
+    # pada area tengah wajah 64x64), terlalu gelap/terang atau terlalu kecil
+    # ditolak tanpa embedding. Nonaktif secara default karena batasnya belum
+    # dikalibrasi pada frame kiosk; skor kualitas tetap dipakai untuk ranking
+    # frame registrasi. Ukuran wajah diukur dalam piksel gambar asli.
+    FACE_QUALITY_GATE = (os.environ.get('FACE_QUALITY_GATE') or 'false').lower() == 'true'
+    FACE_QUALITY_MIN_SHARPNESS = float(os.environ.get('FACE_QUALITY_MIN_SHARPNESS') or 25.0)
+    FACE_QUALITY_MIN_BRIGHTNESS = float(os.environ.get('FACE_QUALITY_MIN_BRIGHTNESS') or 40.0)
+    FACE_QUALITY_MAX_BRIGHTNESS = float(os.environ.get('FACE_QUALITY_MAX_BRIGHTNESS') or 220.0)
+    FACE_QUALITY_MIN_FACE_SIZE = int(os.environ.get('FACE_QUALITY_MIN_FACE_SIZE') or 60)
+    # Registrasi: hanya N frame dengan skor kualitas tertinggi yang di-embed
+    # dan disimpan (0 = semua frame yang lolos)
+    FACE_ENROLL_MAX_FRAMES = int(os.environ.get('FACE_ENROLL_MAX_FRAMES') or 0)
+    # Stream kiosk WebSocket /ws/piket/* (butuh pip install flask-sock):
+    # keputusan dikirim setelah KIOSK_STREAM_CONFIRM_FRAMES frame berturut-turut
+    # mengenali user yang sama, atau gagal setelah KIOSK_STREAM_TIMEOUT detik
+    KIOSK_STREAM_ENABLED = (os.environ.get('KIOSK_STREAM_ENABLED') or 'true').lower() == 'true'
+    KIOSK_STREAM_TIMEOUT = float(os.environ.get('KIOSK_STREAM_TIMEOUT') or 15.0)
+    KIOSK_STREAM_CONFIRM_FRAMES = int(os.environ.get('KIOSK_STREAM_CONFIRM_FRAMES') or 1)
+    # Cache hasil ekstraksi embedding per hash isi gambar (LRU): jumlah
+    # entri (0 = nonaktif), umur maksimal (detik) dan batas memori (MB)
+    FACE_EMBEDDING_CACHE_SIZE = int(os.environ.get('FACE_EMBEDDING_CACHE_SIZE') or 1024)
+    FACE_EMBEDDING_CACHE_TTL = float(os.environ.get('FACE_EMBEDDING_CACHE_TTL') or 600)
+    FACE_EMBEDDING_CACHE_MAX_MB = float(os.environ.get('FACE_EMBEDDING_CACHE_MAX_MB') or 16)
+    # Process pool untuk decode + deteksi Haar + crop (CPU-bound).
+    # FACE_PREPROCESS_WORKERS=0 berarti jumlah CPU; dengan beberapa worker
+    # gunicorn sebaiknya diisi jumlah CPU / jumlah worker.
+    FACE_PREPROCESS_POOL = (os.environ.get('FACE_PREPROCESS_POOL') or 'false').lower() == 'true'
+    FACE_PREPROCESS_WORKERS = int(os.environ.get('FACE_PREPROCESS_WORKERS') or 0)
+    # Muat FaceNet dan jalankan warmup di background saat app start;
+    # /health/ready mengembalikan 503 sampai selesai
+    FACE_WARMUP_ON_START = (os.environ.get('FACE_WARMUP_ON_START') or 'true').lower() == 'true'
+    # Backend inference FaceNet: 'keras' (TensorFlow), 'onnx' atau 'tflite'.
+    # Model onnx/tflite dibuat sekali dengan: python convert_embedder.py --format onnx
+    FACE_EMBEDDER_BACKEND = os.environ.get('FACE_EMBEDDER_BACKEND') or 'keras'
+    FACE_EMBEDDER_MODEL_PATH = os.environ.get('FACE_EMBEDDER_MODEL_PATH') or None
+    # Jumlah thread inference backend onnx/tflite (0 = default runtime)
+    FACE_EMBEDDER_THREADS = int(os.environ.get('FACE_EMBEDDER_THREADS') or 0)
+    # Micro-batching FaceNet: crop dari request yang bersamaan digabung ke
+    # satu forward pass (maksimal INFERENCE_MAX_BATCH crop, menunggu paling
+    # lama INFERENCE_MAX_WAIT_MS sejak crop pertama)
+    INFERENCE_BATCHING = (os.environ.get('INFERENCE_BATCHING') or 'true').lower() == 'true'
+    INFERENCE_MAX_BATCH = int(os.environ.get('INFERENCE_MAX_BATCH') or 16)
+    INFERENCE_MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS') or 5.0)
+    
+    # Penyimpanan vektor wajah biner: 'float32' atau 'float16'
+    FACE_VECTOR_DTYPE = os.environ.get('FACE_VECTOR_DTYPE') or 'float32'
+    # Tulis juga kolom JSON lama selama masa transisi migrasi
+    FACE_VECTOR_WRITE_JSON = (os.environ.get('FACE_VECTOR_WRITE_JSON') or 'false').lower() == 'true'
+    
+    # Template wajah per user (centroid + medoid) dipakai oleh matcher
+    # sebagai pengganti seluruh vektor mentah. Nonaktif secara default;
+    # aktifkan setelah TAR/FAR mode 'templates' di evaluate_templates.py
+    # pada data produksi setara dengan mode 'none'
+    FACE_USE_TEMPLATES = (os.environ.get('FACE_USE_TEMPLATES') or 'false').lower() == 'true'
+    TEMPLATE_MEDOIDS = int(os.environ.get('TEMPLATE_MEDOIDS') or 3)
+    TEMPLATE_OUTLIER_SIGMA = float(os.environ.get('TEMPLATE_OUTLIER_SIGMA') or 2.0)
+    
+    # Konfigurasi indeks galeri wajah: 'exact' (brute-force) atau 'ivf' (ANN)
+    GALLERY_INDEX_BACKEND = os.environ.get('GALLERY_INDEX_BACKEND') or 'exact'
+    # Jumlah cluster IVF dan jumlah cluster yang diperiksa per query.
+    # nprobe lebih besar = recall lebih tinggi, latency lebih besar.
+    IVF_NLIST = int(os.environ.get('IVF_NLIST') or 64)
+    IVF_NPROBE = int(os.environ.get('IVF_NPROBE') or 8)
+    IVF_TRAIN_ITERS = int(os.environ.get('IVF_TRAIN_ITERS') or 15)
+    # Kuantisasi galeri untuk scoring: 'none', 'float16' atau 'int8'.
+    # GALLERY_RERANK_K hit teratas selalu dihitung ulang dengan float32.
+    # Nonaktif secara default; cek selisih akurasi dan latency dengan
+    # evaluate_quantization.py sebelum mengaktifkan
+    GALLERY_QUANTIZATION = os.environ.get('GALLERY_QUANTIZATION') or 'none'
+    GALLERY_RERANK_K = int(os.environ.get('GALLERY_RERANK_K') or 8)
+    # Jumlah versi terakhir yang disimpan di vektor_wajah_log (0 = tidak
+    # pernah dihapus); worker yang tertinggal lebih jauh memuat ulang penuh
+    GALLERY_LOG_RETENTION = int(os.environ.get('GALLERY_LOG_RETENTION') or 1000)
+    # Snapshot galeri yang di-memory-map dan dibagikan oleh semua worker.
+    # Set ke string kosong untuk menonaktifkan.
+    GALLERY_SNAPSHOT_PATH = os.environ.get('GALLERY_SNAPSHOT_PATH', os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'data', 'gallery', 'gallery.snap'
+    ))
+    # File centroid IVF agar tidak dilatih ulang setiap worker start
+    GALLERY_INDEX_PATH = os.environ.get('GALLERY_INDEX_PATH') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'data', 'gallery', 'ivf_index.npz'
+    )
     
     # Folder untuk menyimpan gambar wajah
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(
@@ -40,12 +184,14 @@ class DevelopmentConfig(Config):
     """Konfigurasi untuk development"""
     DEBUG = True
     SQLALCHEMY_ECHO = True
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=5, max_overflow=5)
 
 
 class ProductionConfig(Config):
     """Konfigurasi untuk production"""
     DEBUG = False
     SQLALCHEMY_ECHO = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=10, max_overflow=20)
 
 
 # Dictionary untuk memilih konfigurasi berdasarkan environment
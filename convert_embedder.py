@@ -0,0 +1,213 @@
+"""
+Script konversi bobot FaceNet (keras-facenet) ke ONNX atau TFLite, sekali
+jalan di mesin lokal, beserta uji paritas terhadap jalur Keras
+
+Uji paritas memotong wajah dari foto asli (--images, deteksi Haar yang sama
+dengan FACE_DETECTOR_MODE=haar), menjalankan crop yang sama lewat
+keras_facenet.FaceNet dan backend hasil konversi, lalu membandingkan:
+    - embedding per crop (cosine similarity minimum, selisih absolut maksimum)
+    - top-1 match setiap crop terhadap crop lain dan selisih similarity
+      antar pasangan, termasuk keputusan di SIMILARITY_THRESHOLD
+Script keluar dengan status 1 jika tidak ada crop wajah atau paritas di bawah
+toleransi sehingga bisa dipakai di pipeline deploy.
+
+Dependensi tambahan (hanya untuk konversi):
+    onnx   : pip install tf2onnx onnxruntime
+    tflite : tensorflow (sudah ada), runtime opsional: pip install tflite-runtime
+
+Usage:
+    python convert_embedder.py --format onnx
+    python convert_embedder.py --format tflite --output data/models/facenet.tflite
+    python convert_embedder.py --format onnx --check-only --images data/wajah
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from embedder_backends import DEFAULT_MODEL_PATHS, create_embedder
+from face_preprocessing import FacePreprocessor
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+
+def convert_onnx(model, output, size, opset):
+    """Konversi model Keras ke ONNX dengan tf2onnx (batch dinamis)"""
+    import tensorflow as tf
+    import tf2onnx
+
+    spec = (tf.TensorSpec((None, size, size, 3), tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=output)
+
+
+def convert_tflite(model, output, size, fp16):
+    """Konversi model Keras ke TFLite (batch dinamis, opsional bobot float16)"""
+    import tensorflow as tf
+
+    @tf.function(input_signature=[tf.TensorSpec((None, size, size, 3), tf.float32)])
+    def serve(x):
+        return model(x, training=False)
+
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([serve.get_concrete_function()], model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT] if fp16 else []
+    if fp16:
+        converter.target_spec.supported_types = [tf.float16]
+    with open(output, 'wb') as f:
+        f.write(converter.convert())
+
+
+def load_crops(directory, limit, size):
+    """
+    Crop wajah uji paritas dari foto di direktori; foto tanpa wajah
+    terdeteksi dilewati
+
+    Returns:
+        Tuple (list crop wajah, jumlah foto yang diperiksa)
+    """
+    if not directory or not os.path.isdir(directory):
+        return [], 0
+
+    preprocessor = FacePreprocessor({'FACE_DETECTOR_MODE': 'haar', 'FACE_QUALITY_GATE': False}, size)
+    paths = sorted(p for p in Path(directory).rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+
+    crops = []
+    checked = 0
+    for path in paths:
+        if len(crops) >= limit:
+            break
+        checked += 1
+        img = cv2.imread(str(path))
+        if img is None:
+            continue
+        face, _, _ = preprocessor.prepare(img)
+        if face is not None:
+            crops.append(face)
+    return crops, checked
+
+
+def check_matching(reference, result, tolerance, threshold):
+    """
+    Bandingkan hasil pencocokan antar crop (setiap crop sebagai query
+    terhadap crop lainnya) antara embedding Keras dan backend
+
+    Top-1 dianggap berbeda hanya jika crop pilihan backend lebih buruk dari
+    top-1 Keras lebih dari tolerance (menurut skor Keras), agar crop yang
+    skornya hampir seri tidak dihitung gagal.
+
+    Returns:
+        Tuple (ok, top-1 berbeda, selisih similarity maksimum, keputusan berbeda)
+    """
+    def similarity(embeddings):
+        normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return normalized @ normalized.T
+
+    ref_scores = similarity(reference)
+    res_scores = similarity(result)
+    rows = np.arange(len(reference))
+    off_diagonal = ~np.eye(len(reference), dtype=bool)
+
+    # Crop tidak boleh menjadi top-1 untuk dirinya sendiri
+    ref_top = np.argmax(np.where(off_diagonal, ref_scores, -np.inf), axis=1)
+    res_top = np.argmax(np.where(off_diagonal, res_scores, -np.inf), axis=1)
+    top1_diff = int(np.sum(ref_scores[rows, res_top] < ref_scores[rows, ref_top] - tolerance))
+
+    max_delta = float(np.max(np.abs(ref_scores - res_scores)[off_diagonal]))
+    decision_diff = int(np.sum(((ref_scores >= threshold) != (res_scores >= threshold)) & off_diagonal) // 2)
+
+    return top1_diff == 0 and max_delta <= tolerance, top1_diff, max_delta, decision_diff
+
+
+def check_parity(keras_embedder, backend_embedder, crops, batch_size, tolerance, threshold):
+    """
+    Bandingkan embedding Keras dan backend hasil konversi
+
+    Returns:
+        True jika cosine similarity minimum >= 1 - tolerance dan hasil
+        pencocokan antar crop sama
+    """
+    reference = np.concatenate([
+        keras_embedder.embeddings(crops[i:i + batch_size]) for i in range(0, len(crops), batch_size)
+    ])
+    # Backend diuji dengan ukuran batch berbeda (1 dan batch_size)
+    single = np.concatenate([backend_embedder.embeddings([crop]) for crop in crops])
+    batched = np.concatenate([
+        backend_embedder.embeddings(crops[i:i + batch_size]) for i in range(0, len(crops), batch_size)
+    ])
+
+    passed = True
+    print(f"\nParity check on {len(crops)} face crops (tolerance: cosine >= {1 - tolerance})")
+    print("-" * 72)
+    for label, result in (('batch=1', single), (f'batch={batch_size}', batched)):
+        cosine = np.sum(reference * result, axis=1) / (
+            np.linalg.norm(reference, axis=1) * np.linalg.norm(result, axis=1)
+        )
+        max_abs = float(np.max(np.abs(reference - result)))
+        ok = float(np.min(cosine)) >= 1 - tolerance
+        match_ok, top1_diff, max_delta, decision_diff = check_matching(reference, result, tolerance, threshold)
+        passed &= ok and match_ok
+        print(f"{label:<10} min cosine {np.min(cosine):.6f}  mean cosine {np.mean(cosine):.6f}  "
+              f"max |diff| {max_abs:.2e}  {'OK' if ok else 'FAILED'}")
+        print(f"{'':<10} top-1 changed {top1_diff}/{len(crops)}  max |dSimilarity| {max_delta:.2e}  "
+              f"decisions changed @ {threshold}: {decision_diff}  {'OK' if match_ok else 'FAILED'}")
+    print("-" * 72)
+    return passed
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Konversi FaceNet ke ONNX/TFLite + uji paritas')
+    parser.add_argument('--format', choices=['onnx', 'tflite'], required=True)
+    parser.add_argument('--output', help='Path model hasil konversi (default: data/models/facenet.<format>)')
+    parser.add_argument('--opset', type=int, default=13, help='Opset ONNX')
+    parser.add_argument('--fp16', action='store_true', help='TFLite: simpan bobot sebagai float16')
+    parser.add_argument('--check-only', action='store_true', help='Lewati konversi, hanya uji paritas')
+    parser.add_argument('--images', default=os.getenv('UPLOAD_FOLDER', 'data/wajah'),
+                        help='Direktori foto wajah asli untuk uji paritas (wajib berisi wajah)')
+    parser.add_argument('--samples', type=int, default=32)
+    parser.add_argument('--min-samples', type=int, default=8,
+                        help='Jumlah crop wajah minimal agar uji paritas dianggap valid')
+    parser.add_argument('--threshold', type=float, default=float(os.getenv('SIMILARITY_THRESHOLD', 0.7)),
+                        help='Threshold keputusan pencocokan yang dibandingkan')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--tolerance', type=float, default=1e-3,
+                        help='Toleransi 1 - cosine similarity (fp16 butuh toleransi lebih besar)')
+    args = parser.parse_args()
+
+    from keras_facenet import FaceNet
+
+    output = args.output or DEFAULT_MODEL_PATHS[args.format]
+    keras_embedder = FaceNet()
+    size = keras_embedder.metadata['image_size']
+
+    # Crop dicek sebelum konversi agar kegagalan tidak menunggu proses konversi
+    crops, checked = load_crops(args.images, args.samples, size)
+    if len(crops) < args.min_samples:
+        print(f"✗ Only {len(crops)} face crops found in {checked} images under '{args.images}' "
+              f"(need {args.min_samples}). Parity must be checked on real face photos: pass --images")
+        sys.exit(1)
+
+    if not args.check_only:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        print(f"→ Converting FaceNet to {args.format}: {output}")
+        if args.format == 'onnx':
+            convert_onnx(keras_embedder.model, output, size, args.opset)
+        else:
+            convert_tflite(keras_embedder.model, output, size, args.fp16)
+        print(f"✓ Saved {output} ({os.path.getsize(output) / 1e6:.1f} MB)")
+
+    backend_embedder = create_embedder({
+        'FACE_EMBEDDER_BACKEND': args.format,
+        'FACE_EMBEDDER_MODEL_PATH': output,
+    })
+    if not check_parity(keras_embedder, backend_embedder, crops, args.batch_size, args.tolerance, args.threshold):
+        print("✗ Parity check failed; do not switch FACE_EMBEDDER_BACKEND to this model")
+        sys.exit(1)
+    print(f"✓ Parity OK; set FACE_EMBEDDER_BACKEND={args.format} and FACE_EMBEDDER_MODEL_PATH={output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Modul DB Pool - QueuePool SQLAlchemy dengan metrik checkout
+
+Saat puncak check-in, request bisa tertahan menunggu koneksi database dari
+pool (atau gagal setelah DB_POOL_TIMEOUT). InstrumentedQueuePool mencatat
+lama checkout koneksi (termasuk menunggu koneksi kosong, membuka koneksi
+baru dan pre-ping), jumlah timeout dan koneksi baru, untuk ditampilkan di
+/api/internal/stats bersama jumlah koneksi in-use dan overflow.
+"""
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool yang mengukur waktu connect() (checkout) per proses"""
+
+    # Checkout di atas ambang ini dihitung sebagai 'slow' (menunggu pool)
+    SLOW_CHECKOUT_SECONDS = 0.05
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._slow_checkouts = 0
+        self._timeouts = 0
+        self._connects = 0
+        self._connect_total = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self._timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+
+        with self._stats_lock:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            if waited >= self.SLOW_CHECKOUT_SECONDS:
+                self._slow_checkouts += 1
+        return connection
+
+    def _create_connection(self):
+        start = time.perf_counter()
+        record = super()._create_connection()
+        with self._stats_lock:
+            self._connects += 1
+            self._connect_total += time.perf_counter() - start
+        return record
+
+    def stats(self):
+        """Ukuran pool, koneksi in-use/overflow dan statistik checkout"""
+        with self._stats_lock:
+            checkouts = self._checkouts or 1
+            connects = self._connects or 1
+            return {
+                'pool_size': self.size(),
+                'max_overflow': self._max_overflow,
+                'timeout_seconds': self._timeout,
+                'recycle_seconds': self._recycle,
+                'pre_ping': self._pre_ping,
+                'checked_in': self.checkedin(),
+                'in_use': self.checkedout(),
+                'overflow': max(self.overflow(), 0),
+                'checkouts': self._checkouts,
+                'mean_checkout_ms': self._wait_total / checkouts * 1000,
+                'max_checkout_ms': self._wait_max * 1000,
+                'slow_checkouts': self._slow_checkouts,
+                'timeouts': self._timeouts,
+                'connects': self._connects,
+                'mean_connect_ms': self._connect_total / connects * 1000,
+            }
@@ -0,0 +1,173 @@
+"""
+Modul Embedder Backends - backend inference FaceNet yang bisa dipilih
+
+Backend yang tersedia (FACE_EMBEDDER_BACKEND):
+    keras  : keras_facenet.FaceNet dengan TensorFlow penuh (default)
+    onnx   : ONNX Runtime (CPU), model hasil `python convert_embedder.py --format onnx`
+    tflite : TFLite interpreter, model hasil `python convert_embedder.py --format tflite`
+
+Semua backend memakai preprocessing yang sama dengan keras-facenet
+(resize ke 160x160, (x - 127.5) / 127.5) dan antarmuka yang sama:
+embeddings(), mtcnn(), crop() dan metadata. Backend onnx/tflite tidak
+mengimpor TensorFlow kecuali MTCNN dipakai (FACE_DETECTOR_MODE=haar_mtcnn),
+jadi gunakan FACE_DETECTOR_MODE=haar untuk mendapatkan RSS yang kecil.
+"""
+import os
+import threading
+
+import cv2
+import numpy as np
+
+
+# Metadata model keras-facenet default (20180402-114759)
+FACENET_METADATA = {
+    'image_size': 160,
+    'dimensions': 512,
+    'fixed_image_standardization': True,
+}
+
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'models')
+DEFAULT_MODEL_PATHS = {
+    'onnx': os.path.join(DEFAULT_MODEL_DIR, 'facenet.onnx'),
+    'tflite': os.path.join(DEFAULT_MODEL_DIR, 'facenet.tflite'),
+}
+
+
+def crop_box(image, detection, margin):
+    """Potong kotak deteksi MTCNN dengan margin (sama dengan keras_facenet.utils.cropBox)"""
+    x1, y1, w, h = detection['box']
+    x1 -= margin
+    y1 -= margin
+    w += 2 * margin
+    h += 2 * margin
+    if x1 < 0:
+        w += x1
+        x1 = 0
+    if y1 < 0:
+        h += y1
+        y1 = 0
+    return image[y1:y1 + h, x1:x1 + w]
+
+
+class ExportedFaceNet:
+    """
+    Basis backend FaceNet hasil konversi. Subclass cukup mengimplementasikan
+    _predict(batch) untuk batch float32 (n, 160, 160, 3) yang sudah dinormalisasi.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.metadata = dict(FACENET_METADATA)
+
+    def _normalize(self, image):
+        return (np.float32(image) - 127.5) / 127.5
+
+    def _predict(self, batch):
+        raise NotImplementedError
+
+    @classmethod
+    def mtcnn(cls):
+        """Detektor MTCNN (mengimpor TensorFlow, hanya untuk mode haar_mtcnn)"""
+        if not hasattr(cls, '_mtcnn'):
+            from mtcnn.mtcnn import MTCNN
+            cls._mtcnn = MTCNN()
+        return cls._mtcnn
+
+    def crop(self, image, threshold=0.95):
+        """Deteksi MTCNN dan potong wajah, sama dengan FaceNet.crop"""
+        detections = [d for d in self.mtcnn().detect_faces(image) if d['confidence'] > threshold]
+        if not detections:
+            return [], []
+        margin = int(0.1 * self.metadata['image_size'])
+        return detections, [crop_box(image, d, margin) for d in detections]
+
+    def embeddings(self, images):
+        """
+        Hitung embedding untuk list crop wajah
+
+        Returns:
+            Array float32 (n, 512) ter-normalisasi L2
+        """
+        size = self.metadata['image_size']
+        batch = np.float32([self._normalize(cv2.resize(image, (size, size))) for image in images])
+        return np.asarray(self._predict(batch), dtype=np.float32)
+
+
+class OnnxFaceNet(ExportedFaceNet):
+    """FaceNet dengan ONNX Runtime (CPUExecutionProvider)"""
+
+    def __init__(self, path, threads=0):
+        super().__init__(path)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = int(threads)
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _predict(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class TFLiteFaceNet(ExportedFaceNet):
+    """FaceNet dengan TFLite interpreter (tflite-runtime jika tersedia)"""
+
+    def __init__(self, path, threads=0):
+        super().__init__(path)
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        self.interpreter = Interpreter(model_path=path, num_threads=int(threads) or None)
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+        self._batch_size = None
+        self._lock = threading.Lock()
+
+    def _predict(self, batch):
+        # Interpreter tidak thread-safe dan embeddings() juga dipanggil langsung
+        # dari thread request (INFERENCE_BATCHING=false) dan warmup, sehingga
+        # resize, set_tensor, invoke dan get_tensor harus berurutan
+        with self._lock:
+            if self._batch_size != len(batch):
+                self.interpreter.resize_tensor_input(self.input_index, batch.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = len(batch)
+            self.interpreter.set_tensor(self.input_index, batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output_index).copy()
+
+
+def create_embedder(config=None):
+    """
+    Buat backend embedder dari konfigurasi
+
+    Args:
+        config: Mapping konfigurasi Flask (app.config), opsional
+
+    Returns:
+        Objek dengan antarmuka FaceNet (embeddings, mtcnn, crop, metadata)
+    """
+    config = config or {}
+    backend = (config.get('FACE_EMBEDDER_BACKEND') or 'keras').lower()
+
+    if backend == 'keras':
+        from keras_facenet import FaceNet
+        return FaceNet()
+
+    if backend not in DEFAULT_MODEL_PATHS:
+        raise ValueError(f"Unknown FACE_EMBEDDER_BACKEND: {backend}")
+
+    path = config.get('FACE_EMBEDDER_MODEL_PATH') or DEFAULT_MODEL_PATHS[backend]
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"{backend} model not found at {path}; run: python convert_embedder.py --format {backend}"
+        )
+
+    threads = int(config.get('FACE_EMBEDDER_THREADS', 0))
+    if backend == 'onnx':
+        return OnnxFaceNet(path, threads)
+    return TFLiteFaceNet(path, threads)
@@ -0,0 +1,145 @@
+"""
+Modul Embedding Cache - cache hasil ekstraksi embedding per isi gambar
+
+Kiosk yang retry dan client yang mengirim ulang foto yang sama membayar decode,
+deteksi dan FaceNet lagi. Cache ini menyimpan hasil (embedding, error, quality)
+per hash isi gambar (blake2b 128-bit dari bytes file gambar atau piksel array),
+termasuk hasil 'No face detected', dalam LRU yang dibatasi jumlah entri,
+umur (TTL) dan total memori.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Perkiraan overhead per entri (key, tuple, node OrderedDict) dalam byte
+_ENTRY_OVERHEAD = 200
+# Perkiraan ukuran dict quality (hasil assess_quality) dalam byte
+_QUALITY_OVERHEAD = 400
+
+
+def content_key(data):
+    """
+    Hash isi gambar
+
+    Args:
+        data: Bytes file gambar atau image array
+
+    Returns:
+        Digest 16 byte
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(data, np.ndarray):
+        h.update(f'{data.shape}{data.dtype}'.encode())
+        h.update(np.ascontiguousarray(data).data)
+    else:
+        h.update(data)
+    return h.digest()
+
+
+class EmbeddingCache:
+    """LRU thread-safe (embedding, error, quality) per hash isi gambar"""
+
+    def __init__(self, max_entries=1024, ttl=600.0, max_bytes=16 * 1024 * 1024):
+        """
+        Args:
+            max_entries: Jumlah entri maksimal
+            ttl: Umur entri maksimal dalam detik (0 = tanpa batas)
+            max_bytes: Perkiraan total memori maksimal
+        """
+        self.max_entries = int(max_entries)
+        self.ttl = float(ttl)
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # Statistik
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+
+    @staticmethod
+    def _size(result):
+        embedding, _, quality = result
+        return (_ENTRY_OVERHEAD + (embedding.nbytes if embedding is not None else 0)
+                + (_QUALITY_OVERHEAD if quality is not None else 0))
+
+    def get(self, key):
+        """
+        Ambil hasil yang di-cache
+
+        Returns:
+            Tuple (embedding, error, quality) atau None jika tidak ada / kedaluwarsa
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            stored_at, result = entry
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self._bytes -= self._size(result)
+                self._expired += 1
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return result
+
+    def put(self, key, result):
+        """
+        Simpan hasil (embedding, error, quality); embedding disimpan sebagai
+        salinan read-only agar tidak bisa diubah oleh pemanggil lain. quality
+        (dict assess_quality atau None) dipakai registrasi multi-frame untuk
+        meranking frame tanpa deteksi ulang.
+        """
+        embedding, error, quality = result
+        if embedding is not None:
+            embedding = np.array(embedding, dtype=np.float32)
+            embedding.setflags(write=False)
+        result = (embedding, error, quality)
+        size = self._size(result)
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(old[1])
+
+            self._entries[key] = (time.monotonic(), result)
+            self._bytes += size
+
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted)
+                self._evictions += 1
+
+    def clear(self):
+        """Kosongkan cache (mis. setelah model embedder diganti)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Statistik hit/miss dan ukuran cache"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'expired': self._expired,
+                'evictions': self._evictions,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,159 @@
+"""
+Script evaluasi akurasi dan latency scoring galeri terkuantisasi
+(GALLERY_QUANTIZATION)
+
+Setiap embedding di galeri dipakai sebagai query (leave-one-out) dan hasilnya
+dibandingkan dengan perhitungan cosine similarity float32 penuh atas seluruh
+vektor mentah seperti FaceRecognitionService.find_best_match:
+    - genuine : baris query dikeluarkan, vektor lain milik user yang sama tetap ada
+    - impostor: semua baris milik user query dikeluarkan
+
+Mode 'float16' dan 'int8' memilih kandidat dari skor terkuantisasi lalu
+menghitung ulang GALLERY_RERANK_K hit teratas dengan float32. Kolom TAR
+(genuine dikenali sebagai user yang benar di atas threshold), FAR (impostor
+diterima) dan ms/query menunjukkan selisih akurasi dan latency dibanding
+mode 'none'.
+
+Usage:
+    python evaluate_quantization.py                    # data dari database
+    python evaluate_quantization.py --synthetic 2000   # data sintetis (tanpa database)
+    python evaluate_quantization.py --queries 300 --threshold 0.7
+    python evaluate_quantization.py --modes none,int8 --rerank-k 16
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from gallery import FaceGallery
+
+
+def load_from_database():
+    """Muat matriks vektor mentah dari database SILAB"""
+    from cli_app import create_cli_app
+    from models import db
+
+    app = create_cli_app()
+    with app.app_context():
+        gallery = FaceGallery()
+        gallery.load_from_db(db.session)
+        state = gallery.state
+        return state.matrix, state.user_ids
+
+
+def synthetic_gallery(n_users, per_user=20, dim=512, noise=0.6, seed=0):
+    """Galeri sintetis: setiap user = pusat acak + noise per vektor"""
+    rng = np.random.default_rng(seed)
+    centers = FaceGallery.normalize(rng.normal(size=(n_users, dim)))
+    matrix = np.repeat(centers, per_user, axis=0)
+    matrix += noise / np.sqrt(dim) * rng.normal(size=matrix.shape).astype(np.float32)
+    return FaceGallery.normalize(matrix), np.repeat(np.arange(n_users).astype(str), per_user).astype(object)
+
+
+def reference_search(matrix, user_ids, query, rows):
+    """Referensi: cosine similarity float32 penuh atas baris kandidat"""
+    scores = cosine_similarity([query], matrix[rows])[0]
+    best = int(np.argmax(scores))
+    return user_ids[rows[best]], float(scores[best])
+
+
+def compare_modes(matrix, user_ids, n_queries, threshold, searchers, title, seed=0):
+    """
+    Jalankan query leave-one-out pada setiap searcher dan cetak perbandingan
+    dengan referensi float32
+
+    Args:
+        searchers: List (mode, objek dengan search(query, rows=None), ukuran byte)
+        title: Keterangan tambahan pada baris ringkasan
+    """
+    rng = np.random.default_rng(seed)
+    n = matrix.shape[0]
+    query_rows = rng.choice(n, min(n_queries, n), replace=False)
+    all_rows = np.arange(n)
+
+    # Baris kandidat untuk setiap query: genuine dan impostor
+    cases = []
+    for i in query_rows:
+        cases.append(('genuine', i, np.delete(all_rows, i)))
+        cases.append(('impostor', i, all_rows[user_ids != user_ids[i]]))
+
+    reference = [reference_search(matrix, user_ids, matrix[i], rows) for _, i, rows in cases]
+
+    print(f"\nGallery: {n} vectors, {len(set(user_ids))} users, "
+          f"{len(query_rows)} queries, threshold {threshold}, {title}")
+    print("-" * 124)
+    print(f"{'mode':<10}{'gallery MB':>12}{'top-1 agree':>14}{'decision agree':>17}"
+          f"{'mean |dScore|':>16}{'max |dScore|':>15}{'TAR':>9}{'FAR':>9}{'ms/query':>12}")
+    print("-" * 124)
+
+    for mode, searcher, gallery_bytes in searchers:
+        top1_agree = 0
+        decision_agree = 0
+        genuine = genuine_accepted = 0
+        impostor = impostor_accepted = 0
+        deltas = []
+        for (kind, i, rows), (ref_user, ref_score) in zip(cases, reference):
+            user_id, score = searcher.search(matrix[i], rows=rows)
+            top1_agree += user_id == ref_user
+            decision_agree += (score >= threshold) == (ref_score >= threshold)
+            deltas.append(abs(score - ref_score))
+            if kind == 'genuine':
+                genuine += 1
+                genuine_accepted += score >= threshold and user_id == user_ids[i]
+            else:
+                impostor += 1
+                impostor_accepted += score >= threshold
+
+        # Latency diukur pada pencarian penuh seperti saat check-in
+        start = time.perf_counter()
+        for i in query_rows:
+            searcher.search(matrix[i])
+        elapsed = (time.perf_counter() - start) / len(query_rows)
+
+        total = len(cases)
+        print(f"{mode:<10}{gallery_bytes / 1e6:>12.2f}{top1_agree / total:>14.4f}"
+              f"{decision_agree / total:>17.4f}{np.mean(deltas):>16.2e}{np.max(deltas):>15.2e}"
+              f"{genuine_accepted / max(genuine, 1):>9.4f}{impostor_accepted / max(impostor, 1):>9.4f}"
+              f"{elapsed * 1000:>12.3f}")
+
+
+def evaluate(matrix, user_ids, n_queries, threshold, modes, rerank_k, seed=0):
+    """Bandingkan scoring terkuantisasi dengan referensi float32"""
+    searchers = []
+    for mode in modes:
+        gallery = FaceGallery(quantization=mode, rerank_k=rerank_k)
+        gallery.load_arrays(matrix, user_ids)
+        state = gallery.state
+        # Matriks float32 tetap dipakai untuk re-rank, jadi dihitung juga
+        gallery_bytes = state.matrix.nbytes + (state.quantized.nbytes if state.quantized is not None else 0)
+        searchers.append((mode, gallery, gallery_bytes))
+
+    compare_modes(matrix, user_ids, n_queries, threshold, searchers, f"rerank_k {rerank_k}", seed)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Evaluasi akurasi scoring galeri terkuantisasi')
+    parser.add_argument('--synthetic', type=int, metavar='N_USERS', help='Gunakan galeri sintetis')
+    parser.add_argument('--queries', type=int, default=500, help='Jumlah query leave-one-out')
+    parser.add_argument('--threshold', type=float, default=float(os.getenv('SIMILARITY_THRESHOLD', 0.7)))
+    parser.add_argument('--modes', default='none,float16,int8', help='Mode yang dibandingkan (dipisah koma)')
+    parser.add_argument('--rerank-k', type=int, default=int(os.getenv('GALLERY_RERANK_K', 8)))
+    args = parser.parse_args()
+
+    if args.synthetic:
+        matrix, user_ids = synthetic_gallery(args.synthetic)
+    else:
+        matrix, user_ids = load_from_database()
+
+    if matrix.shape[0] < 2:
+        print("Not enough embeddings to evaluate")
+        return
+
+    evaluate(matrix, user_ids, args.queries, args.threshold, args.modes.split(','), args.rerank_k)
+
+
+if __name__ == '__main__':
+    main()
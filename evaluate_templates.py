@@ -0,0 +1,118 @@
+"""
+Script evaluasi akurasi dan latency matcher template per user (FACE_USE_TEMPLATES)
+
+Setiap embedding di galeri dipakai sebagai query (leave-one-out) dan hasilnya
+dibandingkan dengan perhitungan cosine similarity float32 penuh atas seluruh
+vektor mentah seperti FaceRecognitionService.find_best_match:
+    - genuine : baris query dikeluarkan, vektor lain milik user yang sama tetap ada
+    - impostor: semua baris milik user query dikeluarkan
+
+Mode yang dibandingkan:
+    vectors   : FaceGallery atas seluruh vektor mentah (FACE_USE_TEMPLATES=false)
+    templates : centroid + medoid per user dari compact_embeddings (seperti
+                compact_templates.py); untuk query genuine, template user query
+                dibangun ulang tanpa baris query agar tidak bocor
+
+Kolom TAR (genuine dikenali sebagai user yang benar di atas threshold) dan FAR
+(impostor diterima) menunjukkan apakah akurasi template turun dibanding vectors.
+
+Usage:
+    python evaluate_templates.py                    # data dari database
+    python evaluate_templates.py --synthetic 2000   # data sintetis (tanpa database)
+    python evaluate_templates.py --queries 300 --threshold 0.7
+"""
+import argparse
+import os
+
+import numpy as np
+
+from evaluate_quantization import compare_modes, load_from_database, synthetic_gallery
+from face_templates import compact_embeddings
+from gallery import FaceGallery
+
+
+class TemplateSearch:
+    """Pencarian atas template per user, dengan template leave-one-out untuk query genuine"""
+
+    def __init__(self, matrix, user_ids, n_medoids, outlier_sigma):
+        self.matrix = matrix
+        self.user_ids = user_ids
+        self.n_medoids = n_medoids
+        self.outlier_sigma = outlier_sigma
+
+        templates, owners = [], []
+        for user_id in np.unique(user_ids):
+            for _, vector in self._compact(np.flatnonzero(user_ids == user_id)):
+                templates.append(vector)
+                owners.append(user_id)
+        self.templates = np.asarray(templates, dtype=np.float32)
+        self.owners = np.asarray(owners, dtype=object)
+
+    @property
+    def nbytes(self):
+        return self.templates.nbytes
+
+    def _compact(self, rows):
+        return compact_embeddings(self.matrix[rows], self.n_medoids, self.outlier_sigma)
+
+    def search(self, query, rows=None):
+        """
+        Cari user terbaik; rows = baris vektor mentah yang boleh dipakai
+        (user tanpa baris tersisa dikeluarkan, template user dengan baris yang
+        dikeluarkan dibangun ulang dari baris sisanya)
+        """
+        if rows is None:
+            scores = self.templates @ query
+            best = int(np.argmax(scores))
+            return self.owners[best], float(scores[best])
+
+        allowed = np.zeros(len(self.user_ids), dtype=bool)
+        allowed[rows] = True
+        present = set(self.user_ids[rows])
+        partial = {user_id for user_id in self.user_ids[~allowed] if user_id in present}
+
+        keep = np.array([owner in present and owner not in partial for owner in self.owners], dtype=bool)
+        candidates = [(owner, float(vector @ query)) for owner, vector in zip(self.owners[keep], self.templates[keep])]
+        for user_id in partial:
+            user_rows = np.flatnonzero((self.user_ids == user_id) & allowed)
+            candidates.extend((user_id, float(vector @ query)) for _, vector in self._compact(user_rows))
+        return max(candidates, key=lambda item: item[1])
+
+
+def evaluate(matrix, user_ids, n_queries, threshold, n_medoids=3, outlier_sigma=2.0, seed=0):
+    """Bandingkan matcher vektor mentah dan template dengan referensi"""
+    gallery = FaceGallery()
+    gallery.load_arrays(matrix, user_ids)
+    templates = TemplateSearch(matrix, user_ids, n_medoids, outlier_sigma)
+
+    searchers = [
+        ('vectors', gallery, gallery.state.matrix.nbytes),
+        ('templates', templates, templates.nbytes),
+    ]
+    compare_modes(matrix, user_ids, n_queries, threshold, searchers, f"medoids {n_medoids}", seed)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Evaluasi akurasi matcher template per user')
+    parser.add_argument('--synthetic', type=int, metavar='N_USERS', help='Gunakan galeri sintetis')
+    parser.add_argument('--queries', type=int, default=500, help='Jumlah query leave-one-out')
+    parser.add_argument('--threshold', type=float, default=float(os.getenv('SIMILARITY_THRESHOLD', 0.7)))
+    parser.add_argument('--medoids', type=int, default=int(os.getenv('TEMPLATE_MEDOIDS', 3)))
+    parser.add_argument('--outlier-sigma', type=float, default=float(os.getenv('TEMPLATE_OUTLIER_SIGMA', 2.0)))
+    args = parser.parse_args()
+
+    if args.synthetic:
+        matrix, user_ids = synthetic_gallery(args.synthetic)
+    else:
+        matrix, user_ids = load_from_database()
+
+    if matrix.shape[0] < 2:
+        print("Not enough embeddings to evaluate")
+        return
+
+    evaluate(matrix, user_ids, args.queries, args.threshold, args.medoids, args.outlier_sigma)
+
+
+if __name__ == '__main__':
+    main()
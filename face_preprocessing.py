@@ -0,0 +1,622 @@
+"""
+Modul Face Preprocessing - decode gambar, deteksi Haar dan crop wajah
+
+Modul ini sengaja tidak mengimpor TensorFlow/keras-facenet agar bisa
+dijalankan di process pool (FACE_PREPROCESS_POOL) tanpa memuat model di
+setiap proses. Hasilnya berupa crop wajah kecil yang dikirim balik ke proses
+request untuk di-embed oleh FaceNet.
+"""
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+
+
+# Skala decode JPEG tereduksi, dari yang terkecil
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# Marker SOF JPEG yang memuat dimensi gambar (bukan DHT/JPG/DAC)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# Tipe gambar yang diterima pipeline selain base64 string; nilai JSON lain
+# (angka, list, object) ditolak sebagai 'Failed to decode'
+IMAGE_INPUT_TYPES = (bytes, bytearray, memoryview, np.ndarray)
+
+
+def jpeg_dimensions(data):
+    """
+    Baca ukuran JPEG dari header (segmen SOF) tanpa decode
+    
+    Args:
+        data: Bytes file gambar
+        
+    Returns:
+        Tuple (width, height) atau None jika bukan JPEG / header tidak valid
+    """
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        # Padding 0xFF dan marker tanpa panjang segmen
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        
+        length = (data[i + 2] << 8) | data[i + 3]
+        if marker in _JPEG_SOF_MARKERS:
+            if i + 9 > len(data):
+                return None
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        if marker == 0xDA:
+            # Start of scan sebelum SOF: header tidak valid
+            return None
+        i += 2 + length
+    
+    return None
+
+
+# Key konfigurasi yang dipakai preprocessor (dikirim ke proses pool)
+CONFIG_KEYS = (
+    'FACE_DETECTOR_MODE', 'FACE_CROP_MARGIN', 'FACE_DETECT_MAX_SIZE',
+    'FACE_MIN_SIZE', 'FACE_DECODE_MIN_SIZE', 'FACE_MASK_CACHE_SIZE',
+    'FACE_QUALITY_GATE', 'FACE_QUALITY_MIN_SHARPNESS', 'FACE_QUALITY_MIN_BRIGHTNESS',
+    'FACE_QUALITY_MAX_BRIGHTNESS', 'FACE_QUALITY_MIN_FACE_SIZE',
+)
+
+# Sisi area tengah wajah (piksel) tempat skor kualitas dihitung, agar nilai
+# ketajaman sebanding antar resolusi kamera
+QUALITY_SAMPLE_SIZE = 64
+
+
+class FacePreprocessor:
+    """Decode, deteksi Haar dan crop wajah (CPU-bound, tanpa model FaceNet)"""
+    
+    def __init__(self, config=None, face_size=160):
+        """
+        Args:
+            config: Mapping konfigurasi Flask (app.config), opsional
+            face_size: Ukuran input FaceNet untuk crop mode 'haar'
+        """
+        config = config or {}
+        self.face_size = int(face_size)
+        self.face_cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + 'haarcascade_frontalface_alt2.xml'
+        )
+        # Pipeline deteksi: 'haar_mtcnn' (Haar + MTCNN) atau 'haar' (Haar saja)
+        self.detector_mode = config.get('FACE_DETECTOR_MODE', 'haar_mtcnn')
+        if self.detector_mode not in ('haar_mtcnn', 'haar'):
+            raise ValueError(f"Unknown FACE_DETECTOR_MODE: {self.detector_mode}")
+        self.crop_margin = float(config.get('FACE_CROP_MARGIN', 0.1))
+        # Resolusi maksimal deteksi Haar dan ukuran wajah minimal (piksel asli)
+        self.detect_max_size = int(config.get('FACE_DETECT_MAX_SIZE', 640))
+        self.min_face_size = int(config.get('FACE_MIN_SIZE', 40))
+        # Sisi terpendek minimal hasil decode JPEG tereduksi (0 = nonaktif)
+        self.decode_min_size = int(config.get('FACE_DECODE_MIN_SIZE', 480))
+        # LRU mask oval + buffer kerja per resolusi (0 = alokasi baru per panggilan)
+        self.mask_cache_size = int(config.get('FACE_MASK_CACHE_SIZE', 4))
+        # Quality gate sebelum embedding: ketajaman (variansi Laplacian),
+        # kecerahan rata-rata dan ukuran kotak wajah
+        self.quality_gate = bool(config.get('FACE_QUALITY_GATE', False))
+        self.min_sharpness = float(config.get('FACE_QUALITY_MIN_SHARPNESS', 25.0))
+        self.min_brightness = float(config.get('FACE_QUALITY_MIN_BRIGHTNESS', 40.0))
+        self.max_brightness = float(config.get('FACE_QUALITY_MAX_BRIGHTNESS', 220.0))
+        self.min_quality_face_size = int(config.get('FACE_QUALITY_MIN_FACE_SIZE', 60))
+        self._geometry_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+    
+    def decode(self, image):
+        """
+        Decode gambar dari body request ke image array
+        
+        Args:
+            image: Base64 string (JSON), bytes file gambar (multipart/raw)
+                   atau image array (dikembalikan apa adanya)
+            
+        Returns:
+            Image array (BGR format) atau None jika gagal atau tipe tidak didukung
+        """
+        return self.decode_scaled(image)[0]
+    
+    def decode_scaled(self, image):
+        """
+        Seperti decode, ditambah faktor skala decode JPEG tereduksi sehingga
+        ukuran di gambar hasil decode bisa dikonversi ke piksel gambar asli
+        
+        Returns:
+            Tuple (image array atau None, faktor skala 1/2/4/8)
+        """
+        if isinstance(image, str):
+            image = self.decode_base64_bytes(image)
+            if image is None:
+                return None, 1
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            try:
+                return self.decode_image_bytes_scaled(image)
+            except Exception as e:
+                print(f"Error decoding image: {str(e)}")
+                return None, 1
+        if isinstance(image, np.ndarray):
+            return image, 1
+        print(f"Error decoding image: unsupported type {type(image).__name__}")
+        return None, 1
+    
+    def decode_base64_image(self, base64_string):
+        """
+        Decode base64 string menjadi image array
+        
+        Args:
+            base64_string: Base64 encoded image string (dengan atau tanpa header)
+            
+        Returns:
+            Image array (BGR format) atau None jika gagal
+        """
+        img_bytes = self.decode_base64_bytes(base64_string)
+        if img_bytes is None:
+            return None
+        
+        try:
+            return self.decode_image_bytes(img_bytes)
+        except Exception as e:
+            print(f"Error decoding base64 image: {str(e)}")
+            return None
+    
+    def decode_base64_bytes(self, base64_string):
+        """
+        Decode base64 string menjadi bytes file gambar (tanpa decode gambar)
+        
+        Args:
+            base64_string: Base64 encoded image string (dengan atau tanpa header)
+            
+        Returns:
+            Bytes file gambar atau None jika gagal
+        """
+        import base64
+        
+        try:
+            # Remove header jika ada
+            if ',' in base64_string:
+                base64_string = base64_string.split(',', 1)[1]
+            
+            # Decode base64
+            return base64.b64decode(base64_string)
+        except Exception as e:
+            print(f"Error decoding base64 image: {str(e)}")
+            return None
+    
+    def frame_signature(self, image):
+        """
+        Sidik frame murah untuk mendeteksi frame kamera yang hampir identik:
+        grayscale 32x32. JPEG di-decode langsung pada skala 1/8 sehingga
+        jauh lebih murah daripada decode + deteksi penuh.
+        
+        Args:
+            image: Bytes file gambar atau image array (BGR)
+            
+        Returns:
+            Array int16 (32, 32) atau None jika gagal di-decode
+        """
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            gray = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        elif image is not None and image.ndim == 3:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = image
+        
+        if gray is None or gray.size == 0:
+            return None
+        return cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.int16)
+    
+    def decode_image_bytes(self, img_bytes):
+        """
+        Decode bytes gambar (JPEG/PNG/...) menjadi image array
+        
+        JPEG yang jauh lebih besar dari kebutuhan deteksi di-decode langsung
+        pada skala 1/2, 1/4 atau 1/8 (scaling di domain DCT libjpeg) sehingga
+        waktu decode dan memori per request berkurang.
+        
+        Args:
+            img_bytes: Bytes file gambar
+            
+        Returns:
+            Image array (BGR format) atau None jika gagal
+        """
+        return self.decode_image_bytes_scaled(img_bytes)[0]
+    
+    def decode_image_bytes_scaled(self, img_bytes):
+        """
+        Lihat decode_image_bytes
+        
+        Returns:
+            Tuple (image array atau None, faktor skala decode 1/2/4/8)
+        """
+        nparr = np.frombuffer(img_bytes, np.uint8)
+        
+        size = jpeg_dimensions(img_bytes) if self.decode_min_size else None
+        if size is not None:
+            short_side = min(size)
+            for factor, flag in REDUCED_DECODE_FLAGS:
+                if short_side // factor >= self.decode_min_size:
+                    img = cv2.imdecode(nparr, flag)
+                    if img is not None:
+                        return img, factor
+                    break
+        
+        return cv2.imdecode(nparr, cv2.IMREAD_COLOR), 1
+    
+    def _oval_geometry(self, h, w):
+        """
+        Mask oval, ROI dan ukuran deteksi untuk resolusi (h, w), disimpan di
+        LRU karena kamera kiosk selalu mengirim resolusi yang sama
+        """
+        key = (h, w)
+        with self._cache_lock:
+            geometry = self._geometry_cache.get(key)
+            if geometry is not None:
+                self._geometry_cache.move_to_end(key)
+                return geometry
+        
+        center = (w // 2, h // 2)
+        axes = (int(w * 0.6 / 2), int(h * 0.6667 / 2))
+        x0, y0 = max(center[0] - axes[0], 0), max(center[1] - axes[1], 0)
+        x1, y1 = min(center[0] + axes[0] + 1, w), min(center[1] + axes[1] + 1, h)
+        
+        # Buat mask oval (koordinat ROI)
+        mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        cv2.ellipse(mask, (center[0] - x0, center[1] - y0), axes, 0, 0, 360, 255, -1)
+        
+        scale = 1.0
+        longest = max(y1 - y0, x1 - x0)
+        if self.detect_max_size and longest > self.detect_max_size:
+            scale = self.detect_max_size / longest
+        detect_size = (max(int(round((x1 - x0) * scale)), 1), max(int(round((y1 - y0) * scale)), 1))
+        
+        geometry = {'roi': (x0, y0, x1, y1), 'mask': mask, 'scale': scale, 'detect_size': detect_size}
+        if self.mask_cache_size:
+            with self._cache_lock:
+                self._geometry_cache[key] = geometry
+                while len(self._geometry_cache) > self.mask_cache_size:
+                    self._geometry_cache.popitem(last=False)
+        return geometry
+    
+    def _buffers(self, h, w, img):
+        """
+        Buffer kerja per thread untuk resolusi (h, w): ROI ter-mask,
+        grayscale dan grayscale yang diperkecil
+        
+        Returns:
+            Dict buffer, atau None jika format gambar bukan BGR uint8
+        """
+        if img.dtype != np.uint8 or img.ndim != 3 or img.shape[2] != 3:
+            return None
+        
+        cache = getattr(self._local, 'buffers', None)
+        if cache is None:
+            cache = self._local.buffers = OrderedDict()
+        
+        key = (h, w)
+        buffers = cache.get(key)
+        if buffers is None:
+            geometry = self._oval_geometry(h, w)
+            x0, y0, x1, y1 = geometry['roi']
+            detect_w, detect_h = geometry['detect_size']
+            buffers = {
+                'masked': np.zeros((y1 - y0, x1 - x0, 3), dtype=np.uint8),
+                'gray': np.empty((y1 - y0, x1 - x0), dtype=np.uint8),
+                'small': np.empty((detect_h, detect_w), dtype=np.uint8),
+            }
+            cache[key] = buffers
+            while len(cache) > self.mask_cache_size:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
+        return buffers
+    
+    def detect_face_oval(self, img, decode_scale=1):
+        """
+        Deteksi wajah Haar cascade di dalam mask oval
+        
+        Cascade dijalankan pada salinan grayscale ROI oval yang diperkecil
+        (sisi terpanjang maksimal FACE_DETECT_MAX_SIZE), lalu kotak hasil
+        deteksi dipetakan kembali ke resolusi asli untuk crop berkualitas penuh.
+        
+        Args:
+            img: Image array (BGR format)
+            decode_scale: Faktor decode JPEG tereduksi img (lihat decode_scaled)
+                agar FACE_MIN_SIZE tetap diukur dalam piksel gambar asli
+            
+        Returns:
+            Tuple (masked_roi, box) dengan masked_roi = ROI oval resolusi asli
+            yang sudah di-mask dan box = (x, y, w, h) relatif terhadap ROI,
+            atau (masked_roi, None) jika tidak terdeteksi. masked_roi bisa
+            berupa buffer yang dipakai ulang oleh panggilan berikutnya di
+            thread yang sama; salin crop yang ingin disimpan.
+        """
+        h, w = img.shape[:2]
+        geometry = self._oval_geometry(h, w)
+        x0, y0, x1, y1 = geometry['roi']
+        scale = geometry['scale']
+        
+        # ROI = kotak pembatas oval, area di luarnya selalu hitam
+        roi = img[y0:y1, x0:x1]
+        
+        buffers = self._buffers(h, w, img) if self.mask_cache_size else None
+        if buffers is None:
+            # Terapkan mask
+            masked_roi = cv2.bitwise_and(roi, roi, mask=geometry['mask'])
+            
+            # Deteksi wajah pada grayscale yang diperkecil
+            gray = cv2.cvtColor(masked_roi, cv2.COLOR_BGR2GRAY)
+            if scale < 1.0:
+                gray = cv2.resize(gray, geometry['detect_size'], interpolation=cv2.INTER_AREA)
+        else:
+            # Buffer per thread: piksel di luar mask tidak pernah ditulis
+            # sehingga tetap nol dari alokasi awal
+            masked_roi = buffers['masked']
+            cv2.bitwise_and(roi, roi, dst=masked_roi, mask=geometry['mask'])
+            gray = cv2.cvtColor(masked_roi, cv2.COLOR_BGR2GRAY, dst=buffers['gray'])
+            if scale < 1.0:
+                gray = cv2.resize(gray, geometry['detect_size'], dst=buffers['small'],
+                                  interpolation=cv2.INTER_AREA)
+        
+        min_size = max(int(self.min_face_size / decode_scale * scale), 20)
+        faces = self.face_cascade.detectMultiScale(gray, 1.1, 4, minSize=(min_size, min_size))
+        
+        if len(faces) == 0:
+            return masked_roi, None
+        
+        # Ambil wajah pertama, petakan kembali ke resolusi asli
+        x, y, w_box, h_box = faces[0]
+        roi_h, roi_w = masked_roi.shape[:2]
+        x = min(int(round(x / scale)), roi_w - 1)
+        y = min(int(round(y / scale)), roi_h - 1)
+        w_box = min(int(round(w_box / scale)), roi_w - x)
+        h_box = min(int(round(h_box / scale)), roi_h - y)
+        return masked_roi, (x, y, w_box, h_box)
+    
+    def crop_face_oval(self, img):
+        """
+        Crop wajah dari gambar dengan mask oval
+        
+        Args:
+            img: Image array (BGR format)
+            
+        Returns:
+            Cropped face image atau None jika tidak terdeteksi
+        """
+        masked_img, box = self.detect_face_oval(img)
+        if box is None:
+            return None
+        
+        x, y, w_box, h_box = box
+        return masked_img[y:y + h_box, x:x + w_box].copy()
+    
+    def align_face_box(self, img, box):
+        """
+        Potong kotak wajah menjadi persegi (dengan margin) dan resize ke
+        ukuran input FaceNet, tanpa deteksi ulang
+        
+        Args:
+            img: Image array (BGR format)
+            box: Kotak wajah (x, y, w, h)
+            
+        Returns:
+            Image array ukuran input model (default 160x160)
+        """
+        x, y, w_box, h_box = box
+        side = max(w_box, h_box) * (1 + 2 * self.crop_margin)
+        cx, cy = x + w_box / 2, y + h_box / 2
+        
+        h, w = img.shape[:2]
+        x1 = max(int(round(cx - side / 2)), 0)
+        y1 = max(int(round(cy - side / 2)), 0)
+        x2 = min(int(round(cx + side / 2)), w)
+        y2 = min(int(round(cy + side / 2)), h)
+        
+        return cv2.resize(img[y1:y2, x1:x2], (self.face_size, self.face_size), interpolation=cv2.INTER_AREA)
+    
+    def assess_quality(self, face, face_size):
+        """
+        Hitung skor kualitas crop wajah (murah, tanpa model)
+        
+        Ketajaman dan kecerahan diukur pada area tengah kotak wajah yang
+        diperkecil ke QUALITY_SAMPLE_SIZE, sehingga tepi mask oval dan
+        background tidak ikut terhitung.
+        
+        Args:
+            face: Crop kotak wajah (BGR) sebelum di-resize ke input model
+            face_size: Sisi kotak wajah dalam piksel gambar asli (sebelum
+                decode JPEG tereduksi), agar batas ukuran tidak bergantung
+                pada resolusi kamera
+            
+        Returns:
+            Dict sharpness, brightness, face_size dan score (0-1, untuk ranking)
+        """
+        h, w = face.shape[:2]
+        center = face[h // 5:h - h // 5, w // 5:w - w // 5]
+        gray = cv2.cvtColor(center, cv2.COLOR_BGR2GRAY)
+        sample = cv2.resize(gray, (QUALITY_SAMPLE_SIZE, QUALITY_SAMPLE_SIZE), interpolation=cv2.INTER_AREA)
+        
+        sharpness = float(cv2.Laplacian(sample, cv2.CV_64F).var())
+        brightness = float(sample.mean())
+        
+        # Masing-masing komponen jenuh di 1.0 pada dua kali nilai minimalnya
+        sharpness_score = min(sharpness / (2 * max(self.min_sharpness, 1.0)), 1.0)
+        exposure_score = max(1.0 - abs(brightness - 128.0) / 128.0, 0.0)
+        size_score = min(face_size / (2 * max(self.min_quality_face_size, 1)), 1.0)
+        
+        return {
+            'sharpness': round(sharpness, 1),
+            'brightness': round(brightness, 1),
+            'face_size': int(face_size),
+            'score': round(sharpness_score * exposure_score * size_score, 4),
+        }
+    
+    def check_quality(self, quality):
+        """
+        Bandingkan skor kualitas dengan batas FACE_QUALITY_*
+        
+        Returns:
+            Pesan error 'Low quality: ...' atau None jika lolos / gate nonaktif.
+            Kecerahan dicek sebelum ketajaman karena foto gelap juga
+            menghasilkan variansi Laplacian yang rendah.
+        """
+        if not self.quality_gate:
+            return None
+        if quality['face_size'] < self.min_quality_face_size:
+            return f"Low quality: face too small ({quality['face_size']}px < {self.min_quality_face_size}px)"
+        if quality['brightness'] < self.min_brightness:
+            return f"Low quality: image too dark (brightness {quality['brightness']} < {self.min_brightness})"
+        if quality['brightness'] > self.max_brightness:
+            return f"Low quality: image too bright (brightness {quality['brightness']} > {self.max_brightness})"
+        if quality['sharpness'] < self.min_sharpness:
+            return f"Low quality: image too blurry (sharpness {quality['sharpness']} < {self.min_sharpness})"
+        return None
+    
+    def prepare(self, image):
+        """
+        Decode (jika perlu) dan crop wajah dari satu gambar
+        
+        Mode 'haar' menghasilkan crop persegi siap embed; mode 'haar_mtcnn'
+        menghasilkan crop Haar yang masih perlu dideteksi ulang oleh MTCNN.
+        Kualitas kotak wajah dinilai sebelum crop dikirim ke embedder; crop
+        yang tidak lolos quality gate dikembalikan dengan error 'Low quality: ...'.
+        
+        Args:
+            image: Image array (BGR), base64 string atau bytes file gambar
+            
+        Returns:
+            Tuple (face, error, quality) dengan error 'Failed to decode',
+            'No face detected', 'Low quality: ...' atau None, dan quality
+            berupa dict hasil assess_quality (None jika tidak ada wajah)
+        """
+        image, decode_scale = self.decode_scaled(image)
+        if image is None:
+            return None, 'Failed to decode', None
+        
+        try:
+            masked_img, box = self.detect_face_oval(image, decode_scale)
+            if box is None:
+                return None, 'No face detected', None
+            
+            x, y, w_box, h_box = box
+            quality = self.assess_quality(masked_img[y:y + h_box, x:x + w_box],
+                                          min(w_box, h_box) * decode_scale)
+            error = self.check_quality(quality)
+            if error is not None:
+                return None, error, quality
+            
+            if self.detector_mode == 'haar':
+                face = self.align_face_box(masked_img, box)
+            else:
+                face = masked_img[y:y + h_box, x:x + w_box]
+        except Exception as e:
+            return None, str(e), None
+        
+        # Salin agar yang dikirim antar proses hanya crop, bukan seluruh frame
+        # (masked_img bisa berupa buffer yang dipakai ulang)
+        return np.array(face, copy=True, order='C'), None, quality
+
+
+# =============================================================================
+# Process Pool
+# =============================================================================
+
+_worker_preprocessor = None
+
+
+def _init_worker(config, face_size):
+    """Initializer proses pool: satu FacePreprocessor per proses"""
+    global _worker_preprocessor
+    # Paralelisme sudah di level proses, hindari oversubscription thread OpenCV
+    cv2.setNumThreads(1)
+    _worker_preprocessor = FacePreprocessor(config, face_size)
+
+
+def _prepare_in_worker(image):
+    """Task pool: lihat FacePreprocessor.prepare"""
+    return _worker_preprocessor.prepare(image)
+
+
+class PreprocessPool:
+    """
+    Process pool untuk FacePreprocessor.prepare
+
+    Pool dibuat lazy saat pertama dipakai (setelah fork worker gunicorn) dengan
+    start method 'spawn' agar proses anak tidak mewarisi state TensorFlow.
+    """
+    
+    def __init__(self, config=None, face_size=160, workers=0):
+        """
+        Args:
+            config: Mapping konfigurasi Flask (app.config), opsional
+            face_size: Ukuran input FaceNet
+            workers: Jumlah proses (0 = jumlah CPU)
+        """
+        config = config or {}
+        self.config = {key: config[key] for key in CONFIG_KEYS if key in config}
+        self.face_size = face_size
+        self.workers = int(workers) or os.cpu_count() or 1
+        self._executor = None
+        self._lock = threading.Lock()
+        self._fallback = None
+    
+    def _get_executor(self):
+        """Buat executor jika belum ada (atau setelah pool rusak)"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.config, self.face_size)
+                )
+                print(f"Face preprocessing pool started: {self.workers} processes")
+            return self._executor
+    
+    def prepare_many(self, images):
+        """
+        Jalankan FacePreprocessor.prepare untuk banyak gambar secara paralel
+        
+        Args:
+            images: List image array, base64 string atau bytes
+            
+        Returns:
+            List tuple (face, error, quality) sesuai urutan input
+        """
+        try:
+            return list(self._get_executor().map(_prepare_in_worker, images))
+        except BrokenProcessPool as e:
+            # Proses anak mati (mis. OOM): buat ulang pool berikutnya,
+            # request ini diproses di proses sendiri
+            print(f"Face preprocessing pool broken, falling back: {str(e)}")
+            with self._lock:
+                self._executor = None
+            if self._fallback is None:
+                self._fallback = FacePreprocessor(self.config, self.face_size)
+            return [self._fallback.prepare(image) for image in images]
+    
+    def shutdown(self):
+        """Hentikan proses pool"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
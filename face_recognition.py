@@ -1,53 +1,244 @@
 """
 Modul Face Recognition menggunakan FaceNet
 """
+import threading
+import time
+from contextlib import nullcontext
+
 import cv2
 import numpy as np
-from keras_facenet import FaceNet
 from sklearn.metrics.pairwise import cosine_similarity
 
+from ann_index import create_index
+from embedder_backends import create_embedder
+from embedding_cache import EmbeddingCache, content_key
+from face_preprocessing import IMAGE_INPUT_TYPES, FacePreprocessor, PreprocessPool
+from gallery import FaceGallery
+from inference_scheduler import MicroBatchScheduler
+
+
+# Ukuran input model keras-facenet (20180402-114759)
+FACENET_INPUT_SIZE = 160
+
 
 class FaceRecognitionService:
     """Service untuk face recognition menggunakan FaceNet"""
     
-    def __init__(self):
-        """Inisialisasi FaceNet embedder"""
-        self.embedder = FaceNet()
-        self.face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_alt2.xml'
+    def __init__(self, config=None):
+        """
+        Inisialisasi service. Model FaceNet (TensorFlow) tidak dimuat di sini,
+        melainkan saat pertama dipakai atau lewat start_warmup().
+        
+        Args:
+            config: Mapping konfigurasi Flask (app.config), opsional
+        """
+        self.config = config or {}
+        self._embedder = None
+        self._model_lock = threading.Lock()
+        # Status model: not_loaded, loading, loaded, warming, ready, failed
+        self.model_status = 'not_loaded'
+        self.model_error = None
+        self.model_timings = {}
+        self.ready = threading.Event()
+        # Decode, deteksi Haar dan crop wajah (tanpa TensorFlow)
+        face_size = FACENET_INPUT_SIZE
+        self.preprocessor = FacePreprocessor(self.config, face_size)
+        # Process pool opsional untuk tahap preprocessing yang CPU-bound
+        self.preprocess_pool = None
+        if self.config.get('FACE_PREPROCESS_POOL', False):
+            self.preprocess_pool = PreprocessPool(
+                self.config, face_size,
+                workers=int(self.config.get('FACE_PREPROCESS_WORKERS', 0))
+            )
+        # Micro-batching FaceNet lintas request yang berjalan bersamaan
+        self.scheduler = None
+        if self.config.get('INFERENCE_BATCHING', True):
+            self.scheduler = MicroBatchScheduler(
+                lambda crops: self.embedder.embeddings(crops),
+                max_batch=int(self.config.get('INFERENCE_MAX_BATCH', 16)),
+                max_wait_ms=float(self.config.get('INFERENCE_MAX_WAIT_MS', 5.0))
+            )
+        # Cache hasil ekstraksi per hash isi gambar (retry / foto yang dikirim ulang)
+        self.embedding_cache = None
+        if int(self.config.get('FACE_EMBEDDING_CACHE_SIZE', 1024)) > 0:
+            self.embedding_cache = EmbeddingCache(
+                max_entries=int(self.config.get('FACE_EMBEDDING_CACHE_SIZE', 1024)),
+                ttl=float(self.config.get('FACE_EMBEDDING_CACHE_TTL', 600)),
+                max_bytes=int(float(self.config.get('FACE_EMBEDDING_CACHE_MAX_MB', 16)) * 1024 * 1024)
+            )
+        # Galeri embedding di memori untuk pencocokan 1:N
+        self.gallery = FaceGallery(
+            index=create_index(self.config),
+            use_templates=bool(self.config.get('FACE_USE_TEMPLATES', False)),
+            quantization=self.config.get('GALLERY_QUANTIZATION', 'none'),
+            rerank_k=int(self.config.get('GALLERY_RERANK_K', 8)),
+            snapshot_path=self.config.get('GALLERY_SNAPSHOT_PATH'),
+            log_retention=int(self.config.get('GALLERY_LOG_RETENTION', 1000))
         )
     
+    @property
+    def embedder(self):
+        """Backend FaceNet, dimuat saat pertama kali dibutuhkan"""
+        if self._embedder is None:
+            self.load_models()
+        return self._embedder
+    
+    def load_models(self):
+        """
+        Muat backend FaceNet sesuai FACE_EMBEDDER_BACKEND (sekali, thread-safe)
+        
+        Returns:
+            Instance FaceNet (atau backend ONNX/TFLite dengan antarmuka sama)
+        """
+        with self._model_lock:
+            if self._embedder is not None:
+                return self._embedder
+            
+            self.model_status = 'loading'
+            start = time.perf_counter()
+            try:
+                embedder = create_embedder(self.config)
+            except Exception as e:
+                self.model_status = 'failed'
+                self.model_error = str(e)
+                raise
+            
+            self.model_timings['load_seconds'] = round(time.perf_counter() - start, 3)
+            print(f"FaceNet ({self.config.get('FACE_EMBEDDER_BACKEND', 'keras')}) loaded "
+                  f"in {self.model_timings['load_seconds']}s")
+            self.model_status = 'loaded'
+            self._embedder = embedder
+            return embedder
+    
+    def warmup(self):
+        """
+        Jalankan batch dummy melalui detektor dan embedder agar inisialisasi
+        graph TensorFlow tidak dibayar oleh request check-in pertama
+        """
+        embedder = self.load_models()
+        
+        self.model_status = 'warming'
+        start = time.perf_counter()
+        dummy = np.zeros((FACENET_INPUT_SIZE, FACENET_INPUT_SIZE, 3), dtype=np.uint8)
+        
+        if self.preprocessor.detector_mode == 'haar_mtcnn':
+            embedder.mtcnn().detect_faces(dummy)
+        self.preprocessor.prepare(dummy)
+        
+        # Batch 1 (check-in) dan batch penuh (registrasi/micro-batch)
+        max_batch = self.scheduler.max_batch if self.scheduler else 1
+        for batch_size in sorted({1, max_batch}):
+            embedder.embeddings([dummy] * batch_size)
+        
+        self.model_timings['warmup_seconds'] = round(time.perf_counter() - start, 3)
+        print(f"FaceNet warmup done in {self.model_timings['warmup_seconds']}s")
+    
+    def start_warmup(self, after=None, after_retries=5):
+        """
+        Muat model dan warmup di background thread. Service dianggap siap
+        (self.ready) setelah model selesai di-warmup.
+        
+        Args:
+            after: Callable opsional yang dijalankan setelah warmup model
+                (mis. memuat galeri dari database). Dicoba sekali sebelum
+                ready; jika gagal, service tetap ready dan after dicoba ulang
+                dengan backoff tanpa mengubah status model.
+            after_retries: Jumlah percobaan ulang after setelah gagal
+        
+        Returns:
+            Thread warmup
+        """
+        def run_after():
+            try:
+                after()
+                return True
+            except Exception as e:
+                print(f"Error after model warmup (model is ready): {str(e)}")
+                return False
+        
+        def run():
+            try:
+                self.warmup()
+            except Exception as e:
+                self.model_status = 'failed'
+                self.model_error = str(e)
+                print(f"Error in model warmup: {str(e)}")
+                import traceback
+                traceback.print_exc()
+                return
+            
+            done = after is None or run_after()
+            self.model_status = 'ready'
+            self.ready.set()
+            
+            delay = 1.0
+            for _ in range(after_retries if not done else 0):
+                time.sleep(delay)
+                delay = min(delay * 2, 30.0)
+                if run_after():
+                    break
+        
+        thread = threading.Thread(target=run, name='facenet-warmup', daemon=True)
+        thread.start()
+        return thread
+    
+    def decode_image(self, image):
+        """Decode base64 string atau bytes gambar menjadi image array (lihat FacePreprocessor)"""
+        return self.preprocessor.decode(image)
+    
+    def decode_base64_image(self, base64_string):
+        """Decode base64 string menjadi image array (lihat FacePreprocessor)"""
+        return self.preprocessor.decode_base64_image(base64_string)
+    
+    def decode_image_bytes(self, img_bytes):
+        """Decode bytes gambar menjadi image array (lihat FacePreprocessor)"""
+        return self.preprocessor.decode_image_bytes(img_bytes)
+    
     def crop_face_oval(self, img):
+        """Crop wajah dari gambar dengan mask oval (lihat FacePreprocessor)"""
+        return self.preprocessor.crop_face_oval(img)
+    
+    def refine_face_crop(self, face, threshold=0.95):
         """
-        Crop wajah dari gambar dengan mask oval
+        Tahap deteksi kedua di proses utama: pada mode 'haar_mtcnn' crop Haar
+        dideteksi ulang oleh MTCNN keras-facenet, pada mode 'haar' crop sudah
+        siap di-embed
         
         Args:
-            img: Image array (BGR format)
+            face: Crop hasil FacePreprocessor.prepare
+            threshold: Confidence minimum deteksi MTCNN
             
         Returns:
-            Cropped face image atau None jika tidak terdeteksi
+            Crop wajah siap di-embed atau None jika tidak terdeteksi
         """
-        h, w = img.shape[:2]
-        center = (w // 2, h // 2)
-        axes = (int(w * 0.6 / 2), int(h * 0.6667 / 2))
-        
-        # Buat mask oval
-        mask = np.zeros((h, w), dtype=np.uint8)
-        cv2.ellipse(mask, center, axes, 0, 0, 360, 255, -1)
+        if self.preprocessor.detector_mode == 'haar':
+            return face
         
-        # Terapkan mask
-        masked_img = cv2.bitwise_and(img, img, mask=mask)
+        # FaceNet.crop menjalankan MTCNN dan memotong wajah dengan margin
+        # yang sama seperti FaceNet.extract
+        _, crops = self.embedder.crop(face, threshold=threshold)
+        return crops[0] if crops else None
+    
+    def detect_face_crop(self, img, threshold=0.95):
+        """
+        Potong wajah dari gambar sesuai FACE_DETECTOR_MODE
+        (tanpa menjalankan FaceNet)
         
-        # Deteksi wajah
-        gray = cv2.cvtColor(masked_img, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
+        Mode:
+            haar_mtcnn : crop Haar lalu dideteksi ulang oleh MTCNN keras-facenet
+            haar       : kotak Haar langsung di-align ke input FaceNet
         
-        if len(faces) == 0:
+        Args:
+            img: Image array (BGR format)
+            threshold: Confidence minimum deteksi MTCNN
+            
+        Returns:
+            Crop wajah siap di-embed atau None jika tidak terdeteksi
+        """
+        face, _, _ = self.preprocessor.prepare(img)
+        if face is None:
             return None
-        
-        # Ambil wajah pertama
-        x, y, w_box, h_box = faces[0]
-        return masked_img[y:y + h_box, x:x + w_box]
+        return self.refine_face_crop(face, threshold)
     
     def extract_embedding(self, img):
         """
@@ -59,43 +250,339 @@ class FaceRecognitionService:
         Returns:
             Embedding array (512 dimensions) atau None jika gagal
         """
-        face_img = self.crop_face_oval(img)
-        if face_img is None:
-            return None
+        embedding, error = self.extract_embeddings_batch([img])[0]
+        if error not in (None, 'No face detected'):
+            print(f"Error extracting embedding: {error}")
+        return embedding
+    
+    def extract_embeddings_batch(self, images):
+        """
+        Extract embedding dari banyak gambar dengan satu forward pass FaceNet.
+        Semua gambar di-decode dan di-crop terlebih dahulu, lalu crop yang
+        valid di-embed sekaligus dalam satu batch.
+        
+        Args:
+            images: List image array (BGR), base64 string atau bytes
+            
+        Hasil per gambar di-cache berdasarkan hash isi gambar
+        (FACE_EMBEDDING_CACHE_*), sehingga gambar yang sama tidak di-decode,
+        dideteksi dan di-embed ulang.
+        
+        Returns:
+            List tuple (embedding, error) sesuai urutan input; error berisi
+            pesan ('Failed to decode', 'No face detected', ...) atau None
+        """
+        if self.embedding_cache is None:
+            with self.scheduler.request() if self.scheduler else nullcontext():
+                return self._extract_embeddings_batch(images)
+        
+        results = [None] * len(images)
+        misses = []
+        for i, (image, key, cached) in enumerate(self._lookup_cache(images)):
+            if image is None:
+                results[i] = (None, 'Failed to decode')
+            elif cached is not None:
+                results[i] = cached[:2]
+            else:
+                misses.append((i, key, image))
+        
+        if not misses:
+            return results
+        
+        # Hanya miss yang masuk antrian micro-batch
+        with self.scheduler.request() if self.scheduler else nullcontext():
+            prepared = self._prepare_faces([image for _, _, image in misses])
+            extracted = self._embed_prepared(prepared)
+        
+        for (i, key, _), (_, _, quality), (embedding, error) in zip(misses, prepared, extracted):
+            results[i] = (embedding, error)
+            self._store_cache(key, embedding, error, quality)
+        
+        return results
+    
+    def _lookup_cache(self, images):
+        """
+        Ubah base64 menjadi bytes file gambar lalu cari hasilnya di cache
+        embedding (hash bytes file gambar, bukan string base64-nya)
+        
+        Returns:
+            List tuple (image, key, cached) sesuai urutan input; image None
+            jika tipe input tidak didukung, cached None jika cache miss atau
+            cache nonaktif
+        """
+        entries = []
+        for image in images:
+            if isinstance(image, str):
+                image = self.preprocessor.decode_base64_bytes(image)
+            if not isinstance(image, IMAGE_INPUT_TYPES):
+                entries.append((None, None, None))
+                continue
+            
+            if self.embedding_cache is None:
+                entries.append((image, None, None))
+                continue
+            
+            key = content_key(image)
+            entries.append((image, key, self.embedding_cache.get(key)))
+        return entries
+    
+    def _store_cache(self, key, embedding, error, quality):
+        """Simpan hasil deterministik saja (bukan error decode/exception)"""
+        if key is None or self.embedding_cache is None:
+            return
+        if embedding is not None or error == 'No face detected' or error.startswith('Low quality'):
+            self.embedding_cache.put(key, (embedding, error, quality))
+    
+    def _extract_embeddings_batch(self, images):
+        """Implementasi extract_embeddings_batch (lihat di atas)"""
+        return self._embed_prepared(self._prepare_faces(images))
+    
+    def _prepare_faces(self, images):
+        """
+        Decode + deteksi Haar + quality gate + crop, paralel di process pool
+        jika aktif
+        
+        Returns:
+            List tuple (face, error, quality) sesuai urutan input
+        """
+        if self.preprocess_pool is not None:
+            return self.preprocess_pool.prepare_many(images)
+        return [self.preprocessor.prepare(img) for img in images]
+    
+    def _embed_prepared(self, prepared):
+        """
+        Refine (MTCNN) dan embed crop hasil _prepare_faces dalam satu batch
+        
+        Returns:
+            List tuple (embedding, error) sesuai urutan input
+        """
+        results = [(None, None)] * len(prepared)
+        crops = []
+        crop_indices = []
+        
+        for i, (face, error, _) in enumerate(prepared):
+            if error is not None:
+                results[i] = (None, error)
+                continue
+            
+            try:
+                face = self.refine_face_crop(face)
+            except Exception as e:
+                results[i] = (None, str(e))
+                continue
+            
+            if face is None:
+                results[i] = (None, 'No face detected')
+                continue
+            
+            crops.append(face)
+            crop_indices.append(i)
+        
+        if not crops:
+            return results
         
         try:
-            faces = self.embedder.extract(face_img, threshold=0.95)
-            return faces[0]['embedding'] if faces else None
+            embeddings = self.embed_faces(crops)
         except Exception as e:
-            print(f"Error extracting embedding: {str(e)}")
-            return None
+            for i in crop_indices:
+                results[i] = (None, str(e))
+            return results
+        
+        for i, embedding in zip(crop_indices, embeddings):
+            results[i] = (embedding, None)
+        
+        return results
     
-    def decode_base64_image(self, base64_string):
+    def extract_enrollment_embeddings(self, images):
         """
-        Decode base64 string menjadi image array
+        Extract embedding untuk registrasi multi-frame dari kamera.
+        
+        Tahapan:
+            1. Frame berurutan yang hampir identik (grayscale 32x32) dikelompokkan
+               sebelum deteksi (FRAME_DEDUP_THRESHOLD, default nonaktif)
+            2. Deteksi + quality gate hanya untuk satu kandidat per kelompok
+               (frame berikutnya dicoba jika kandidat gagal); frame dengan skor
+               kualitas tertinggi per kelompok yang diambil
+            3. Jika FACE_ENROLL_MAX_FRAMES diisi, hanya N frame terbaik yang diambil
+            4. Embedding yang praktis sama dengan yang sudah diambil dibuang
+        
+        Kedua tahap dedup selalu menyisakan minimal FRAME_DEDUP_MIN_FRAMES frame
+        (jika tersedia; frame lain dalam kelompok dideteksi bila perlu) agar
+        template per user tetap punya variasi. Frame yang
+        hasilnya ada di cache embedding (upload insert/update yang di-retry)
+        tidak di-decode, dideteksi dan di-embed ulang.
         
         Args:
-            base64_string: Base64 encoded image string (dengan atau tanpa header)
+            images: List base64 string, bytes atau image array
             
         Returns:
-            Image array (BGR format) atau None jika gagal
+            List tuple (embedding, error, skipped) sesuai urutan input;
+            skipped berisi alasan frame dilewati atau None
         """
-        import base64
+        frame_threshold = float(self.config.get('FRAME_DEDUP_THRESHOLD', 0.0))
+        embedding_threshold = float(self.config.get('EMBEDDING_DEDUP_SIMILARITY', 0.99))
+        min_frames = int(self.config.get('FRAME_DEDUP_MIN_FRAMES', 5))
+        max_frames = int(self.config.get('FACE_ENROLL_MAX_FRAMES', 0))
         
-        try:
-            # Remove header jika ada
-            if ',' in base64_string:
-                base64_string = base64_string.split(',', 1)[1]
+        results = [(None, None, None)] * len(images)
+        kept = []
+        kept_images = []
+        keys = []
+        # Embedding per frame dari cache atau hasil embed (index frame -> embedding)
+        embedded = {}
+        prepared = []
+        
+        for i, (image, key, cached) in enumerate(self._lookup_cache(images)):
+            if image is None:
+                results[i] = (None, 'Failed to decode', None)
+                continue
+            if cached is not None:
+                embedding, error, quality = cached
+                if embedding is not None:
+                    embedded[len(kept)] = embedding
+                prepared.append((None, error, quality))
+            else:
+                prepared.append(None)
+            kept.append(i)
+            kept_images.append(image)
+            keys.append(key)
+        
+        def usable(k):
+            return k in embedded or (prepared[k] is not None and prepared[k][0] is not None)
+        
+        def score(k):
+            return prepared[k][2]['score']
+        
+        # Tahap 1: kelompokkan frame berurutan yang hampir identik (grayscale
+        # 32x32, dibandingkan dengan frame pertama kelompok) sebelum deteksi
+        groups = [[k] for k in range(len(kept))]
+        if frame_threshold > 0 and len(kept) > min_frames:
+            groups = []
+            reference = None
+            for k in range(len(kept)):
+                signature = self.preprocessor.frame_signature(kept_images[k])
+                if (reference is not None and signature is not None
+                        and np.abs(signature - reference).mean() < frame_threshold):
+                    groups[-1].append(k)
+                    continue
+                groups.append([k])
+                reference = signature
+        
+        # Kandidat per kelompok: frame dari cache dulu (gratis), lalu urutan kamera
+        candidates = [sorted(group, key=lambda k: prepared[k] is None) for group in groups]
+        
+        def prepare(frames):
+            for k, result in zip(frames, self._prepare_faces([kept_images[k] for k in frames])):
+                prepared[k] = result
+                if result[0] is None:
+                    self._store_cache(keys[k], None, result[1], result[2])
+        
+        def unprepared(group):
+            return [k for k in group if prepared[k] is None]
+        
+        with self.scheduler.request() if self.scheduler else nullcontext():
+            # Tahap 2: deteksi + quality gate hanya untuk kandidat kelompok; frame
+            # berikutnya dalam kelompok dicoba jika kandidat gagal
+            while True:
+                frames = [unprepared(group)[0] for group in candidates
+                          if not any(usable(k) for k in group) and unprepared(group)]
+                if not frames:
+                    break
+                prepare(frames)
             
-            # Decode base64
-            img_bytes = base64.b64decode(base64_string)
-            nparr = np.frombuffer(img_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            best = {max(usable_frames, key=score)
+                    for usable_frames in ([k for k in group if usable(k)] for group in candidates)
+                    if usable_frames}
             
-            return img
-        except Exception as e:
-            print(f"Error decoding base64 image: {str(e)}")
-            return None
+            # Jamin minimal min_frames frame: ambil frame lolos lain yang sudah
+            # dideteksi, lalu deteksi frame tersisa bergiliran antar kelompok
+            while len(best) < min_frames:
+                extra = sorted((k for k in range(len(kept)) if usable(k) and k not in best), key=score, reverse=True)
+                best.update(extra[:min_frames - len(best)])
+                if len(best) >= min_frames:
+                    break
+                
+                rest = [unprepared(group) for group in candidates]
+                frames = []
+                for depth in range(max(map(len, rest), default=0)):
+                    frames.extend(group[depth] for group in rest if depth < len(group))
+                if not frames:
+                    break
+                prepare(frames[:min_frames - len(best)])
+            
+            selected = sorted(best)
+            for group in candidates:
+                leaders = [k for k in group if k in best]
+                leader = max(leaders, key=score) if leaders else None
+                for k in group:
+                    if k in best:
+                        continue
+                    # Frame yang belum dideteksi atau lolos deteksi hanya ada di
+                    # kelompok yang punya frame terpilih (leader)
+                    if prepared[k] is not None and not usable(k):
+                        results[kept[k]] = (None, prepared[k][1], None)
+                    elif prepared[k] is None:
+                        results[kept[k]] = (None, None, f'near-duplicate frame of image {kept[leader] + 1}')
+                    else:
+                        results[kept[k]] = (None, None, f'near-duplicate frame of image {kept[leader] + 1} '
+                                                        f'(score {score(k):.3f} <= {score(leader):.3f})')
+            
+            # Tahap 3: pilih N frame terbaik sebelum embedding
+            if max_frames > 0 and len(selected) > max_frames:
+                ranked = sorted(selected, key=score, reverse=True)
+                cutoff = score(ranked[max_frames - 1])
+                for k in ranked[max_frames:]:
+                    results[kept[k]] = (None, None, f"lower quality than the best {max_frames} frames "
+                                                    f"(score {score(k):.3f} <= {cutoff:.3f})")
+                selected = sorted(ranked[:max_frames])
+            
+            pending = [k for k in selected if k not in embedded]
+            errors = {}
+            for k, (embedding, error) in zip(pending, self._embed_prepared([prepared[k] for k in pending])):
+                self._store_cache(keys[k], embedding, error, prepared[k][2])
+                if embedding is None:
+                    errors[k] = error
+                else:
+                    embedded[k] = embedding
+        
+        # Tahap 4: buang embedding yang hampir sama dengan yang sudah diambil,
+        # setelah minimal min_frames embedding tersimpan
+        stored = []
+        for k in selected:
+            i = kept[k]
+            if k in errors:
+                results[i] = (None, errors[k], None)
+                continue
+            
+            embedding = embedded[k]
+            vector = FaceGallery.normalize(embedding)
+            if embedding_threshold < 1.0 and len(stored) >= min_frames:
+                match = max(((j, float(vector @ other)) for j, other in stored),
+                            key=lambda item: item[1], default=None)
+                if match is not None and match[1] >= embedding_threshold:
+                    results[i] = (None, None, f'duplicate embedding of image {match[0] + 1} '
+                                              f'(similarity {match[1]:.3f})')
+                    continue
+            stored.append((i, vector))
+            
+            results[i] = (embedding, None, None)
+        
+        return results
+    
+    def embed_faces(self, crops):
+        """
+        Jalankan FaceNet pada crop wajah, lewat micro-batch scheduler
+        bersama jika INFERENCE_BATCHING aktif
+        
+        Args:
+            crops: List crop wajah
+            
+        Returns:
+            List/array embedding sesuai urutan crop
+        """
+        if self.scheduler is not None:
+            return self.scheduler.embed(crops)
+        return self.embedder.embeddings(crops)
     
     def find_best_match(self, test_embedding, stored_embeddings, threshold=0.7):
         """
@@ -156,7 +643,72 @@ class FaceRecognitionService:
             print(f"Error saving image: {str(e)}")
             return False
     
-    def find_best_match_from_db(self, test_embedding, db_session, threshold=0.7):
+    def find_top_matches_from_db(self, test_embedding, db_session, k=5):
+        """
+        Cari k user paling mirip dengan embedding dari galeri database
+        
+        Args:
+            test_embedding: Embedding yang akan dicocokkan
+            db_session: SQLAlchemy database session
+            k: Jumlah kandidat user
+            
+        Returns:
+            List of dictionaries urut dari similarity tertinggi
+            Format: [{
+                'rank': 1,
+                'user_id': '...',
+                'name': '...',
+                'similarity': 0.95
+            }, ...]
+        """
+        from models import Users
+        
+        # Sinkronkan galeri di memori (hanya delta jika ada perubahan)
+        self.gallery.sync(db_session)
+        
+        matches = self.gallery.search_topk(test_embedding, k=k)
+        if not matches:
+            return []
+        
+        # Ambil nama semua kandidat dalam satu query
+        names = dict(
+            db_session.query(Users.id, Users.name).filter(
+                Users.id.in_([user_id for user_id, _, _ in matches])
+            )
+        )
+        
+        return [{
+            'rank': rank,
+            'user_id': user_id,
+            'name': names.get(user_id),
+            'similarity': similarity
+        } for user_id, similarity, rank in matches]
+    
+    @staticmethod
+    def check_match(candidates, threshold, margin=0.0):
+        """
+        Terapkan aturan threshold dan margin terbaik vs kedua terbaik
+        
+        Args:
+            candidates: List (user_id, similarity, rank) atau dict hasil top-k
+            threshold: Threshold similarity minimum
+            margin: Selisih minimum similarity kandidat pertama dan kedua
+            
+        Returns:
+            Tuple (accepted, reason) dengan reason 'no_candidates',
+            'below_threshold', 'ambiguous' atau 'match'
+        """
+        if not candidates:
+            return False, 'no_candidates'
+        
+        scores = [c['similarity'] if isinstance(c, dict) else c[1] for c in candidates[:2]]
+        if scores[0] < threshold:
+            return False, 'below_threshold'
+        if margin > 0 and len(scores) > 1 and scores[0] - scores[1] < margin:
+            return False, 'ambiguous'
+        return True, 'match'
+    
+    def find_best_match_from_db(self, test_embedding, db_session, threshold=0.7, margin=None):
         """
         Cari kecocokan terbaik dari embedding dengan data di database
         
@@ -164,6 +716,8 @@ class FaceRecognitionService:
             test_embedding: Embedding yang akan dicocokkan
             db_session: SQLAlchemy database session
             threshold: Threshold similarity (default 0.7)
+            margin: Selisih minimum terhadap kandidat kedua
+                (default FACE_MATCH_MARGIN dari config, 0 = nonaktif)
             
         Returns:
             Dictionary dengan data user dan similarity, atau None jika tidak cocok
@@ -176,51 +730,30 @@ class FaceRecognitionService:
         """
         try:
             # Import models dari database SILAB
-            from models import Users, VektorWajah
+            from models import Users
             
-            # Ambil semua vektor wajah dari database
-            vektor_list = db_session.query(VektorWajah).all()
+            if margin is None:
+                margin = float(self.config.get('FACE_MATCH_MARGIN', 0.0))
             
-            if not vektor_list:
-                print("No face embeddings found in database")
-                return None
-            
-            # Siapkan stored_embeddings untuk find_best_match
-            stored_embeddings = []
-            for vektor in vektor_list:
-                try:
-                    # Pastikan vektor.vektor adalah numpy array
-                    if isinstance(vektor.vektor, str):
-                        # Jika masih string, convert ke numpy array
-                        import json
-                        embedding_array = np.array(json.loads(vektor.vektor))
-                    else:
-                        embedding_array = np.array(vektor.vektor)
-                    
-                    # Gunakan user_id bukan id_anggota
-                    stored_embeddings.append((vektor.user_id, embedding_array))
-                    print(f"✓ Loaded embedding for user {vektor.user_id} (shape: {embedding_array.shape})")
-                except Exception as e:
-                    print(f"✗ Error processing embedding for user {vektor.user_id}: {str(e)}")
-                    continue
+            # Sinkronkan galeri di memori (hanya delta jika ada perubahan)
+            self.gallery.sync(db_session)
             
-            if not stored_embeddings:
-                print("No valid embeddings to compare")
+            if self.gallery.size == 0:
+                print("No face embeddings found in database")
                 return None
             
-            print(f"Total valid embeddings: {len(stored_embeddings)}")
-            
-            # Gunakan method find_best_match yang sudah ada
-            best_user_id, similarity = self.find_best_match(
-                test_embedding, 
-                stored_embeddings, 
-                threshold
-            )
+            # Top-2 user dalam satu pass untuk aturan margin
+            candidates = self.gallery.search_topk(test_embedding, k=2)
+            accepted, reason = self.check_match(candidates, threshold, margin)
             
-            if not best_user_id:
-                print(f"No match found (best similarity: {similarity:.3f}, threshold: {threshold})")
+            if not accepted:
+                best = candidates[0][1] if candidates else 0.0
+                second = candidates[1][1] if len(candidates) > 1 else 0.0
+                print(f"No match found ({reason}, best similarity: {best:.3f}, "
+                      f"second: {second:.3f}, threshold: {threshold}, margin: {margin})")
                 return None
             
+            best_user_id, similarity, _ = candidates[0]
             print(f"✓ Best match: User {best_user_id} (similarity: {similarity:.3f})")
             
             # Ambil data user dari tabel Users (bukan Anggota)
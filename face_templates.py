@@ -0,0 +1,122 @@
+"""
+Modul Face Templates - kompaksi vektor enrollment menjadi template per user
+
+Setiap user menyimpan hingga 20 vektor mentah. Template ringkas terdiri dari
+satu centroid ter-normalisasi dan beberapa medoid yang beragam, dengan vektor
+outlier dibuang, sehingga matcher cukup membandingkan 2-4 vektor per user.
+"""
+import numpy as np
+
+from gallery import FaceGallery, parse_vector, vector_columns
+
+
+def compact_embeddings(embeddings, n_medoids=3, outlier_sigma=2.0, kmedoid_iters=5,
+                       duplicate_similarity=0.999):
+    """
+    Turunkan template ringkas dari sekumpulan embedding satu user
+
+    Args:
+        embeddings: Array (n, dim) atau list embedding
+        n_medoids: Jumlah maksimal medoid
+        outlier_sigma: Vektor dengan similarity ke centroid di bawah
+            mean - outlier_sigma * std dibuang
+        kmedoid_iters: Jumlah iterasi penyempurnaan k-medoids
+        duplicate_similarity: Medoid dengan similarity di atas nilai ini
+            terhadap template yang sudah dipilih tidak disimpan
+
+    Returns:
+        List of tuples (jenis, vector) dengan jenis 'centroid' atau 'medoid'
+    """
+    X = FaceGallery.normalize(np.asarray(embeddings, dtype=np.float32))
+    if X.ndim != 2 or X.shape[0] == 0:
+        return []
+
+    centroid = FaceGallery.normalize(X.mean(axis=0))
+    if X.shape[0] == 1:
+        return [('centroid', centroid)]
+
+    # Buang outlier (misalnya frame blur atau wajah lain) sebelum memilih medoid
+    sims = X @ centroid
+    if X.shape[0] >= 5:
+        inliers = sims >= sims.mean() - outlier_sigma * sims.std()
+        if inliers.sum() >= 2:
+            X = X[inliers]
+            centroid = FaceGallery.normalize(X.mean(axis=0))
+            sims = X @ centroid
+
+    k = min(n_medoids, X.shape[0])
+    similarity = X @ X.T
+
+    # Inisialisasi farthest-point: mulai dari vektor terdekat ke centroid,
+    # lalu pilih vektor yang paling tidak mirip dengan medoid terpilih
+    medoids = [int(np.argmax(sims))]
+    while len(medoids) < k:
+        closest = similarity[:, medoids].max(axis=1)
+        closest[medoids] = np.inf
+        medoids.append(int(np.argmin(closest)))
+
+    # Penyempurnaan k-medoids: medoid = anggota dengan total similarity terbesar
+    for _ in range(kmedoid_iters):
+        labels = np.argmax(similarity[:, medoids], axis=1)
+        updated = []
+        for cluster in range(k):
+            members = np.flatnonzero(labels == cluster)
+            if members.size == 0:
+                updated.append(medoids[cluster])
+                continue
+            within = similarity[np.ix_(members, members)].sum(axis=1)
+            updated.append(int(members[np.argmax(within)]))
+        if updated == medoids:
+            break
+        medoids = updated
+
+    # Medoid yang praktis identik dengan template lain tidak menambah informasi
+    templates = [('centroid', centroid)]
+    for idx in medoids:
+        if max(float(X[idx] @ vector) for _, vector in templates) < duplicate_similarity:
+            templates.append(('medoid', X[idx]))
+    return templates
+
+
+def rebuild_user_templates(db_session, user_id, config=None):
+    """
+    Hitung ulang template_wajah user dari seluruh vektor_wajah miliknya.
+    Dipanggil sebelum commit; perubahan vektor yang masih pending ikut
+    terbaca karena autoflush.
+
+    Args:
+        db_session: SQLAlchemy database session
+        user_id: UUID user
+        config: Mapping konfigurasi Flask (app.config), opsional
+
+    Returns:
+        Jumlah template yang disimpan
+    """
+    from models import TemplateWajah, VektorWajah
+
+    config = config or {}
+
+    vectors = []
+    rows = db_session.query(VektorWajah.vektor_bin, VektorWajah.vektor).filter(
+        VektorWajah.user_id == user_id
+    )
+    for raw_bin, raw_json in rows:
+        try:
+            vectors.append(parse_vector(raw_bin if raw_bin is not None else raw_json))
+        except Exception as e:
+            print(f"✗ Error processing embedding for user {user_id}: {str(e)}")
+
+    db_session.query(TemplateWajah).filter(TemplateWajah.user_id == user_id).delete(
+        synchronize_session=False
+    )
+
+    templates = compact_embeddings(
+        vectors,
+        n_medoids=int(config.get('TEMPLATE_MEDOIDS', 3)),
+        outlier_sigma=float(config.get('TEMPLATE_OUTLIER_SIGMA', 2.0))
+    ) if vectors else []
+
+    for jenis, vector in templates:
+        db_session.add(TemplateWajah(user_id=user_id, jenis=jenis, **vector_columns(vector, config)))
+
+    return len(templates)
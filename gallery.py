@@ -0,0 +1,607 @@
+"""
+Modul Face Gallery - indeks embedding wajah di memori untuk pencocokan 1:N
+"""
+import json
+import threading
+
+import numpy as np
+
+from ann_index import ExactIndex
+from gallery_snapshot import (
+    SOURCE_TEMPLATES, SOURCE_VECTORS, map_snapshot, snapshot_file_id, write_snapshot
+)
+from quantization import quantize
+
+
+# Tipe data penyimpanan biner yang didukung (little-endian)
+VECTOR_DTYPES = {
+    'float32': np.dtype('<f4'),
+    'float16': np.dtype('<f2'),
+}
+
+
+def _blob_dtype(nbytes, dim):
+    """Tentukan dtype blob vektor berdasarkan panjangnya"""
+    for dtype in VECTOR_DTYPES.values():
+        if nbytes == dim * dtype.itemsize:
+            return dtype
+    raise ValueError(f'invalid embedding blob size {nbytes}')
+
+
+def parse_vector(raw, dim=512):
+    """
+    Konversi nilai kolom vektor menjadi array float32. Mendukung kolom biner
+    vektor_bin (float32/float16) dan kolom JSON lama (string/list).
+
+    Args:
+        raw: Nilai kolom vektor_bin atau vektor dari database
+        dim: Dimensi embedding yang diharapkan
+
+    Returns:
+        Array float32 1D
+    """
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        return np.frombuffer(raw, dtype=_blob_dtype(len(raw), dim)).astype(np.float32)
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    vector = np.asarray(raw, dtype=np.float32).ravel()
+    if vector.shape[0] != dim:
+        raise ValueError(f'invalid embedding dimension {vector.shape[0]}')
+    return vector
+
+
+def encode_vector(vector, dtype='float32'):
+    """
+    Konversi embedding menjadi bytes untuk kolom vektor_bin
+
+    Args:
+        vector: Embedding (array/list)
+        dtype: 'float32' atau 'float16'
+
+    Returns:
+        Raw little-endian bytes
+    """
+    return np.asarray(vector, dtype=VECTOR_DTYPES[dtype]).ravel().tobytes()
+
+
+def vector_columns(vector, config=None):
+    """
+    Nilai kolom vektor untuk disimpan ke vektor_wajah/template_wajah
+
+    Args:
+        vector: Embedding (array/list)
+        config: Mapping konfigurasi Flask (app.config), opsional
+
+    Returns:
+        Dict kwargs {'vektor_bin': ..., 'vektor': ...} untuk constructor model.
+        Kolom JSON hanya diisi jika FACE_VECTOR_WRITE_JSON aktif (masa transisi).
+    """
+    config = config or {}
+    columns = {'vektor_bin': encode_vector(vector, config.get('FACE_VECTOR_DTYPE', 'float32'))}
+    if config.get('FACE_VECTOR_WRITE_JSON', False):
+        columns['vektor'] = np.asarray(vector, dtype=np.float32).ravel().tolist()
+    return columns
+
+
+class GalleryState:
+    """
+    Isi galeri untuk satu versi. Tidak pernah diubah setelah dibuat, sehingga
+    bisa diganti secara atomik tanpa pembaca melihat data yang tidak sinkron.
+    """
+
+    def __init__(self, matrix, user_ids, index_state=None, quantized=None):
+        self.matrix = matrix
+        self.user_ids = user_ids
+        self.index_state = index_state
+        self.quantized = quantized
+
+        # Kode integer per user; karena baris satu user berurutan, skor per
+        # user cukup dihitung dengan np.maximum.reduceat di batas kode
+        change = np.ones(len(user_ids), dtype=bool)
+        if len(user_ids) > 1:
+            change[1:] = user_ids[1:] != user_ids[:-1]
+        self.user_codes = np.cumsum(change) - 1
+
+
+class FaceGallery:
+    """
+    Galeri embedding wajah yang disimpan sebagai satu matriks float32
+    ter-normalisasi L2 beserta array user_id yang sejajar, sehingga
+    pencocokan 1:N cukup satu perkalian matriks-vektor dan argmax.
+
+    Galeri bersifat versioned: setiap perubahan vektor wajah menaikkan counter
+    galeri_versi dan dicatat di tabel vektor_wajah_log dengan versi tersebut,
+    dan setiap worker hanya menerapkan delta (baris milik user yang berubah)
+    ketika versi di database lebih baru dari versinya. Hanya log_retention versi
+    terakhir yang disimpan di vektor_wajah_log; worker yang tertinggal lebih
+    jauh dari itu memuat ulang galeri secara penuh.
+
+    Jika snapshot_path diisi, matriks float32 dibagikan antar worker lewat
+    file snapshot yang di-memory-map (lihat gallery_snapshot).
+    """
+
+    def __init__(self, dim=512, index=None, use_templates=False, quantization='none', rerank_k=8,
+                 snapshot_path=None, log_retention=1000):
+        """
+        Args:
+            dim: Dimensi embedding (FaceNet = 512)
+            index: Backend indeks dari ann_index (default ExactIndex)
+            use_templates: Gunakan template_wajah (centroid + medoid) untuk
+                user yang memilikinya, bukan seluruh vektor mentah
+            quantization: 'none', 'float16' atau 'int8' untuk scoring kandidat
+            rerank_k: Jumlah hit teratas yang dihitung ulang dengan float32
+                saat quantization aktif
+            snapshot_path: Path file snapshot galeri bersama (None = nonaktif)
+            log_retention: Jumlah versi terakhir yang disimpan di
+                vektor_wajah_log (0 = log tidak pernah dihapus)
+        """
+        self.dim = dim
+        self.index = index or ExactIndex()
+        self.use_templates = use_templates
+        self.quantization = quantization
+        self.rerank_k = rerank_k
+        self.snapshot_path = snapshot_path or None
+        self.log_retention = int(log_retention)
+        self._snapshot_file_id = None
+        self._lock = threading.RLock()
+        self._loaded = False
+        # Versi = nilai counter galeri_versi yang sudah diterapkan
+        self.version = 0
+        # Baris milik user yang sama selalu berurutan (contiguous)
+        self._state = GalleryState(np.empty((0, dim), dtype=np.float32), np.empty(0, dtype=object))
+
+    @property
+    def state(self):
+        """GalleryState versi saat ini (read-only)"""
+        return self._state
+
+    @property
+    def loaded(self):
+        """True setelah galeri dimuat dari database atau snapshot"""
+        return self._loaded
+
+    @property
+    def size(self):
+        """Jumlah embedding di galeri"""
+        return self._state.matrix.shape[0]
+
+    @staticmethod
+    def normalize(vectors):
+        """
+        Normalisasi L2 per baris
+
+        Args:
+            vectors: Array 1D atau 2D
+
+        Returns:
+            Array float32 ter-normalisasi (baris nol dibiarkan nol)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    @staticmethod
+    def record_change(db_session, user_id):
+        """
+        Catat perubahan vektor wajah user agar semua worker menerapkan delta.
+        Dipanggil sebelum commit, di transaksi yang sama dengan perubahan vektor.
+
+        Counter galeri_versi dinaikkan dengan UPDATE sehingga baris counter
+        terkunci sampai commit: transaksi lain yang juga mencatat perubahan
+        menunggu, dan versi yang lebih besar tidak pernah terlihat sebelum
+        versi yang lebih kecil.
+
+        Args:
+            db_session: SQLAlchemy database session
+            user_id: UUID user yang vektornya berubah
+        """
+        from sqlalchemy.exc import IntegrityError
+
+        from models import GaleriVersi, VektorWajahLog
+
+        counter = db_session.query(GaleriVersi).filter(GaleriVersi.id == 1)
+        if not counter.update({GaleriVersi.versi: GaleriVersi.versi + 1}, synchronize_session=False):
+            # Database baru tanpa baris counter; penulis lain mungkin membuatnya bersamaan
+            try:
+                with db_session.begin_nested():
+                    db_session.add(GaleriVersi(id=1, versi=1))
+            except IntegrityError:
+                counter.update({GaleriVersi.versi: GaleriVersi.versi + 1}, synchronize_session=False)
+
+        version = db_session.query(GaleriVersi.versi).filter(GaleriVersi.id == 1).scalar()
+        db_session.add(VektorWajahLog(user_id=user_id, versi=version))
+
+    def _build(self, rows):
+        """
+        Bangun (matrix, user_ids) dari baris (user_id, vektor). Baris biner
+        dengan ukuran sama di-decode sekaligus dengan satu np.frombuffer.
+
+        Returns:
+            Tuple (matrix float32 ter-normalisasi, array user_id)
+        """
+        n = len(rows)
+        matrix = np.empty((n, self.dim), dtype=np.float32)
+        valid = np.ones(n, dtype=bool)
+
+        # Kelompokkan baris berdasarkan ukuran blob (None = JSON lama)
+        groups = {}
+        for i, (_, raw) in enumerate(rows):
+            key = len(raw) if isinstance(raw, (bytes, bytearray, memoryview)) else None
+            groups.setdefault(key, []).append(i)
+
+        blob_sizes = {self.dim * dtype.itemsize: dtype for dtype in VECTOR_DTYPES.values()}
+        for nbytes, indices in groups.items():
+            if nbytes in blob_sizes:
+                blob = b''.join(rows[i][1] for i in indices)
+                matrix[indices] = np.frombuffer(blob, dtype=blob_sizes[nbytes]).reshape(-1, self.dim)
+                continue
+
+            # Fallback per baris: JSON lama atau blob tidak valid
+            for i in indices:
+                try:
+                    matrix[i] = parse_vector(rows[i][1], self.dim)
+                except Exception as e:
+                    valid[i] = False
+                    print(f"✗ Error processing embedding for user {rows[i][0]}: {str(e)}")
+
+        user_ids = np.array([row[0] for row in rows], dtype=object)
+        return self.normalize(matrix[valid]), user_ids[valid]
+
+    @staticmethod
+    def _dual_read(query, model):
+        """
+        Ambil baris (user_id, vektor) dari kolom biner, dan dari kolom JSON
+        hanya untuk baris lama yang belum dimigrasi ke vektor_bin
+        """
+        binary_rows = query.with_entities(model.user_id, model.vektor_bin).filter(
+            model.vektor_bin.isnot(None)
+        ).all()
+        legacy_rows = query.with_entities(model.user_id, model.vektor).filter(
+            model.vektor_bin.is_(None)
+        ).all()
+        return binary_rows + legacy_rows
+
+    def _query_rows(self, db_session, user_ids=None):
+        """
+        Ambil baris (user_id, vektor) untuk galeri, terurut per user
+
+        Args:
+            db_session: SQLAlchemy database session
+            user_ids: Batasi ke user tertentu (None = semua user)
+        """
+        from models import TemplateWajah, VektorWajah
+
+        raw_query = db_session.query(VektorWajah).order_by(VektorWajah.user_id, VektorWajah.id_vektor_wajah)
+        if user_ids is not None:
+            raw_query = raw_query.filter(VektorWajah.user_id.in_(user_ids))
+
+        if self.use_templates:
+            template_query = db_session.query(TemplateWajah).order_by(
+                TemplateWajah.user_id, TemplateWajah.id_template_wajah
+            )
+            if user_ids is not None:
+                template_query = template_query.filter(TemplateWajah.user_id.in_(user_ids))
+            template_rows = self._dual_read(template_query, TemplateWajah)
+
+            # User tanpa template (belum di-backfill) tetap memakai vektor mentah
+            with_templates = db_session.query(TemplateWajah.user_id).distinct()
+            raw_query = raw_query.filter(~VektorWajah.user_id.in_(with_templates))
+        else:
+            template_rows = []
+
+        # Sort stabil per user_id menjaga baris satu user tetap berurutan
+        return sorted(template_rows + self._dual_read(raw_query, VektorWajah), key=lambda row: row[0])
+
+    @staticmethod
+    def _fetch_version(db_session):
+        """
+        Ambil versi galeri di database (satu lookup primary key)
+
+        Returns:
+            Nilai counter galeri_versi (0 jika belum ada perubahan)
+        """
+        from models import GaleriVersi
+
+        return db_session.query(GaleriVersi.versi).filter(GaleriVersi.id == 1).scalar() or 0
+
+    def _install(self, matrix, user_ids, version=0):
+        """Pasang state galeri baru dari matriks yang sudah ter-normalisasi"""
+        with self._lock:
+            self._state = GalleryState(
+                matrix, user_ids, self.index.build(matrix), quantize(matrix, self.quantization)
+            )
+            self.version = version
+            self._loaded = True
+
+    def load_from_db(self, db_session):
+        """
+        Muat ulang seluruh galeri dari tabel vektor_wajah
+
+        Args:
+            db_session: SQLAlchemy database session
+        """
+        with self._lock:
+            # Versi dibaca sebelum data, sehingga perubahan yang terjadi di
+            # antaranya akan diterapkan ulang (idempoten) pada sync berikutnya
+            version = self._fetch_version(db_session)
+
+            matrix, user_ids = self._build(self._query_rows(db_session))
+            self._install(np.ascontiguousarray(matrix), user_ids, version)
+
+        print(f"Face gallery loaded: {matrix.shape[0]} embeddings (version {version})")
+
+    def load_arrays(self, matrix, user_ids):
+        """
+        Isi galeri langsung dari array (tanpa database), misalnya untuk evaluasi
+
+        Args:
+            matrix: Matriks embedding (n, dim), akan dinormalisasi
+            user_ids: Array user_id sejajar dengan baris matriks
+        """
+        self._install(np.ascontiguousarray(self.normalize(matrix)), np.asarray(user_ids, dtype=object))
+
+    @property
+    def _snapshot_source(self):
+        return SOURCE_TEMPLATES if self.use_templates else SOURCE_VECTORS
+
+    def load_snapshot(self):
+        """
+        Petakan snapshot galeri dari disk jika lebih baru dari galeri di memori
+
+        Returns:
+            True jika snapshot dipakai
+        """
+        if not self.snapshot_path:
+            return False
+
+        with self._lock:
+            try:
+                snapshot = map_snapshot(self.snapshot_path, self._snapshot_source)
+            except Exception as e:
+                print(f"Error mapping gallery snapshot {self.snapshot_path}: {str(e)}")
+                return False
+
+            if snapshot is None or snapshot['matrix'].shape[1] != self.dim:
+                return False
+            if self._loaded and snapshot['version'] < self.version:
+                return False
+
+            self._install(snapshot['matrix'], snapshot['user_ids'], snapshot['version'])
+            self._snapshot_file_id = snapshot['file_id']
+
+        print(f"Face gallery mapped from snapshot: {self.size} embeddings (version {self.version})")
+        return True
+
+    def save_snapshot(self):
+        """
+        Tulis galeri di memori sebagai snapshot baru lalu petakan ulang,
+        sehingga worker ini juga memakai salinan bersama di page cache
+        """
+        if not self.snapshot_path:
+            return
+
+        with self._lock:
+            state = self._state
+            try:
+                written = write_snapshot(
+                    self.snapshot_path, state.matrix, state.user_ids,
+                    self.version, self._snapshot_source
+                )
+            except Exception as e:
+                print(f"Error writing gallery snapshot {self.snapshot_path}: {str(e)}")
+                return
+
+            if written:
+                self.load_snapshot()
+
+    def apply_delta(self, db_session, changed_user_ids):
+        """
+        Ganti baris milik user tertentu dengan data terbaru dari database
+
+        Args:
+            db_session: SQLAlchemy database session
+            changed_user_ids: Iterable user_id yang vektornya berubah
+        """
+        changed_user_ids = sorted(set(changed_user_ids))
+        if not changed_user_ids:
+            return
+
+        new_matrix, new_user_ids = self._build(self._query_rows(db_session, changed_user_ids))
+
+        state = self._state
+        keep = ~np.isin(state.user_ids, changed_user_ids)
+        matrix = np.ascontiguousarray(np.vstack([state.matrix[keep], new_matrix]))
+
+        quantized = None
+        if state.quantized is not None:
+            quantized = state.quantized.take(keep).concat(quantize(new_matrix, self.quantization))
+
+        self._state = GalleryState(
+            matrix,
+            np.concatenate([state.user_ids[keep], new_user_ids]),
+            self.index.update(state.index_state, matrix, keep, new_matrix),
+            quantized
+        )
+
+        print(f"Face gallery delta applied: {len(changed_user_ids)} users, "
+              f"{int((~keep).sum())} removed, {new_matrix.shape[0]} added")
+
+    def sync(self, db_session):
+        """
+        Pastikan galeri sesuai dengan database. Pemuatan penuh hanya dilakukan
+        sekali; selanjutnya cukup satu query versi per request dan delta untuk
+        user yang berubah.
+
+        Args:
+            db_session: SQLAlchemy database session
+        """
+        from models import VektorWajahLog
+
+        if not self._loaded and not self.load_snapshot():
+            self.load_from_db(db_session)
+            self.save_snapshot()
+            return
+
+        version = self._fetch_version(db_session)
+        if version <= self.version:
+            return
+
+        with self._lock:
+            # Worker lain (thread) mungkin sudah menerapkan delta yang sama
+            if version <= self.version:
+                return
+
+            # Worker lain sudah menulis snapshot baru: cukup petakan ulang
+            if self.snapshot_path and snapshot_file_id(self.snapshot_path) != self._snapshot_file_id:
+                self.load_snapshot()
+                if version <= self.version:
+                    return
+
+            # Entri log yang dibutuhkan sudah dihapus (lihat prune_log)
+            if self.log_retention and version - self.version > self.log_retention:
+                self.load_from_db(db_session)
+                self.save_snapshot()
+                return
+
+            # Versi <= counter yang terbaca sudah pasti ter-commit, sehingga
+            # rentang ini tidak punya celah seperti id autoincrement
+            changed = {
+                user_id for (user_id,) in db_session.query(VektorWajahLog.user_id).filter(
+                    VektorWajahLog.versi > self.version,
+                    VektorWajahLog.versi <= version
+                ).distinct()
+            }
+
+            self.apply_delta(db_session, changed)
+            self.version = max(version, self.version)
+            self.save_snapshot()
+
+    def publish(self, db_session):
+        """
+        Terapkan perubahan yang baru di-commit worker ini dan tulis snapshot
+        baru untuk worker lain. Error hanya dicatat karena data sudah tersimpan.
+
+        Args:
+            db_session: SQLAlchemy database session
+        """
+        try:
+            self.sync(db_session)
+            self.prune_log(db_session)
+        except Exception as e:
+            print(f"Error publishing face gallery: {str(e)}")
+
+    def prune_log(self, db_session):
+        """
+        Hapus entri vektor_wajah_log yang lebih lama dari log_retention versi
+        terakhir (dan entri lama tanpa versi dari sebelum migrasi 0004).
+        Worker yang versinya lebih tua dari batas ini tidak membaca log lagi
+        tetapi memuat ulang galeri penuh di sync, sehingga tabel tidak tumbuh
+        tanpa batas.
+
+        Args:
+            db_session: SQLAlchemy database session (di-commit)
+
+        Returns:
+            Jumlah entri yang dihapus
+        """
+        from sqlalchemy import or_
+
+        from models import VektorWajahLog
+
+        if not self.log_retention:
+            return 0
+
+        floor = self.version - self.log_retention
+        deleted = db_session.query(VektorWajahLog).filter(
+            or_(VektorWajahLog.versi <= floor, VektorWajahLog.versi.is_(None))
+        ).delete(synchronize_session=False)
+        db_session.commit()
+        return deleted
+
+    def invalidate(self):
+        """Tandai galeri perlu dimuat ulang penuh pada sync berikutnya"""
+        with self._lock:
+            self._loaded = False
+
+    def search(self, embedding, rows=None):
+        """
+        Cari embedding paling mirip di galeri
+
+        Args:
+            embedding: Embedding query (512 dimensions)
+            rows: Batasi pencarian ke baris tertentu (terurut naik), melewati
+                backend ANN (dipakai oleh script evaluasi)
+
+        Returns:
+            Tuple (user_id, similarity_score) atau (None, 0) jika galeri kosong
+        """
+        matches = self.search_topk(embedding, k=1, rows=rows)
+        if not matches:
+            return None, 0.0
+        return matches[0][0], matches[0][1]
+
+    def search_topk(self, embedding, k=5, rows=None):
+        """
+        Cari k user paling mirip dalam satu pass tervektorisasi
+
+        Args:
+            embedding: Embedding query (512 dimensions)
+            k: Jumlah user kandidat
+            rows: Batasi pencarian ke baris tertentu (terurut naik)
+
+        Returns:
+            List of tuples (user_id, similarity, rank), satu entri per user,
+            urut dari similarity tertinggi (rank mulai dari 1)
+        """
+        state = self._state
+        if state.matrix.shape[0] == 0 or embedding is None:
+            return []
+
+        query = self.normalize(np.ravel(embedding))
+
+        # Backend ANN mempersempit kandidat, skor kandidat tetap exact
+        if rows is None:
+            rows = self.index.candidates(state.index_state, query)
+        if rows is not None and rows.size == 0:
+            return []
+
+        rows, scores = self._score_rows(state, query, rows, k)
+        return self._top_users(state, rows, scores, k)
+
+    def _score_rows(self, state, query, rows, k):
+        """
+        Hitung skor exact float32 untuk baris kandidat
+
+        Returns:
+            Tuple (rows terurut naik atau None = semua baris, skor float32)
+        """
+        if state.quantized is None:
+            if rows is None:
+                return None, state.matrix @ query
+            return rows, state.matrix[rows] @ query
+
+        # Skor perkiraan dari matriks terkuantisasi untuk memilih kandidat,
+        # lalu hit teratas dihitung ulang dengan float32
+        approx = state.quantized.scores(query, rows)
+        n_rerank = min(max(self.rerank_k, k * 4), approx.shape[0])
+        top = np.argpartition(-approx, n_rerank - 1)[:n_rerank]
+        top = np.sort(top if rows is None else rows[top])
+        return top, state.matrix[top] @ query
+
+    @staticmethod
+    def _top_users(state, rows, scores, k):
+        """Ambil skor maksimum per user lalu k user teratas (argpartition)"""
+        codes = state.user_codes if rows is None else state.user_codes[rows]
+        starts = np.flatnonzero(np.diff(codes, prepend=-1))
+        best = np.maximum.reduceat(scores, starts)
+
+        k = min(k, best.size)
+        top = np.argpartition(-best, k - 1)[:k]
+        top = top[np.argsort(-best[top])]
+
+        first_rows = starts[top] if rows is None else rows[starts[top]]
+        return [
+            (state.user_ids[row], float(best[idx]), rank)
+            for rank, (idx, row) in enumerate(zip(top, first_rows), 1)
+        ]
@@ -0,0 +1,202 @@
+"""
+Modul Gallery Snapshot - file galeri yang di-memory-map oleh semua worker
+
+Format file (little-endian):
+    header   : 64 bytes (magic, format, dim, n, version, id_width, source)
+    matrix   : n x dim float32 ter-normalisasi
+    user_ids : n x id_width bytes (ASCII, di-pad dengan NUL)
+
+Worker memetakan file secara read-only sehingga N worker berbagi satu salinan
+di page cache. Penulis membuat file sementara di direktori yang sama lalu
+menggantinya dengan os.replace (atomik); mapping lama tetap valid sampai
+dilepas oleh worker yang masih memakainya. Cek versi dan os.replace dijalankan
+di bawah flock pada file <path>.lock agar penulis yang lebih lambat dengan versi
+lama tidak menimpa snapshot yang lebih baru.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Windows (server development satu proses): tanpa lock antar proses
+    fcntl = None
+
+
+MAGIC = b'PIKETGAL'
+# Format 2: version = counter galeri_versi (format 1 memakai id vektor_wajah_log)
+FORMAT_VERSION = 2
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('format', '<u4'),
+    ('dim', '<u4'),
+    ('n', '<u8'),
+    ('version', '<i8'),
+    ('id_width', '<u4'),
+    ('source', '<u4'),
+    ('reserved', 'S24'),
+])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+
+# Sumber baris galeri, harus sama antara penulis dan pembaca snapshot
+SOURCE_VECTORS = 0
+SOURCE_TEMPLATES = 1
+
+
+def _parse_header(raw):
+    """Parse bytes header, None jika bukan snapshot yang valid"""
+    if len(raw) != HEADER_SIZE:
+        return None
+
+    header = np.frombuffer(raw, dtype=HEADER_DTYPE)[0]
+    if header['magic'] != MAGIC or header['format'] != FORMAT_VERSION:
+        return None
+    return header
+
+
+def read_header(path):
+    """
+    Baca header snapshot
+
+    Returns:
+        numpy record header, atau None jika file tidak ada/tidak valid
+    """
+    try:
+        with open(path, 'rb') as f:
+            return _parse_header(f.read(HEADER_SIZE))
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def _writer_lock(path):
+    """Lock eksklusif antar proses untuk penulis snapshot di path yang sama"""
+    if fcntl is None:
+        yield
+        return
+
+    with open(f'{path}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _is_newer(path, version, source):
+    """Cek apakah snapshot di disk sudah lebih baru dari versi yang akan ditulis"""
+    current = read_header(path)
+    return current is not None and current['source'] == source and int(current['version']) > version
+
+
+def write_snapshot(path, matrix, user_ids, version, source):
+    """
+    Tulis snapshot galeri secara atomik
+
+    Args:
+        path: Path file snapshot
+        matrix: Matriks float32 (n, dim) ter-normalisasi
+        user_ids: Array user_id sejajar dengan baris matriks
+        version: Versi galeri (counter galeri_versi)
+        source: SOURCE_VECTORS atau SOURCE_TEMPLATES
+
+    Returns:
+        True jika snapshot ditulis, False jika snapshot di disk sudah lebih baru
+    """
+    # Cek awal tanpa lock agar penulis lama tidak perlu menulis file sementara
+    if _is_newer(path, version, source):
+        return False
+
+    n, dim = matrix.shape
+    encoded_ids = [str(user_id).encode('ascii') for user_id in user_ids]
+    id_width = max((len(user_id) for user_id in encoded_ids), default=1)
+
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header[0] = (MAGIC, FORMAT_VERSION, dim, n, version, id_width, source, b'')
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.snap.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header.tobytes())
+            f.write(np.ascontiguousarray(matrix, dtype='<f4').tobytes())
+            f.write(np.array(encoded_ids, dtype=f'S{id_width}').tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp membuat file 0600; worker lain cukup butuh akses baca
+        os.chmod(tmp_path, 0o644)
+
+        # Cek ulang versi tepat sebelum replace, di bawah lock penulis
+        with _writer_lock(path):
+            if _is_newer(path, version, source):
+                os.remove(tmp_path)
+                return False
+            os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return True
+
+
+def map_snapshot(path, source):
+    """
+    Petakan snapshot secara read-only
+
+    Args:
+        path: Path file snapshot
+        source: Sumber baris yang diharapkan (SOURCE_VECTORS/SOURCE_TEMPLATES)
+
+    Returns:
+        Dict {'matrix', 'user_ids', 'version', 'file_id'},
+        atau None jika snapshot tidak ada atau tidak cocok
+    """
+    # Header, ukuran dan mapping dibaca dari file descriptor yang sama agar
+    # tidak tercampur jika snapshot diganti penulis di tengah proses
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+    with f:
+        header = _parse_header(f.read(HEADER_SIZE))
+        if header is None or header['source'] != source:
+            return None
+
+        n = int(header['n'])
+        dim = int(header['dim'])
+        id_width = int(header['id_width'])
+        stat = os.fstat(f.fileno())
+        if stat.st_size != HEADER_SIZE + n * dim * 4 + n * id_width:
+            return None
+
+        if n == 0:
+            matrix = np.empty((0, dim), dtype=np.float32)
+            user_ids = np.empty(0, dtype=object)
+        else:
+            matrix = np.memmap(f, dtype='<f4', mode='r', offset=HEADER_SIZE, shape=(n, dim))
+            raw_ids = np.memmap(f, dtype=f'S{id_width}', mode='r',
+                                offset=HEADER_SIZE + n * dim * 4, shape=(n,))
+            user_ids = np.array([user_id.decode('ascii') for user_id in raw_ids], dtype=object)
+
+    return {
+        'matrix': matrix,
+        'user_ids': user_ids,
+        'version': int(header['version']),
+        'file_id': (stat.st_ino, stat.st_mtime_ns),
+    }
+
+
+def snapshot_file_id(path):
+    """Identitas file snapshot saat ini (berubah setiap kali diganti)"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
@@ -0,0 +1,168 @@
+"""
+Modul Inference Scheduler - micro-batching FaceNet lintas request
+
+Request check-in yang datang bersamaan (mis. saat pergantian shift) masing-
+masing hanya membawa satu crop wajah. Scheduler mengumpulkan crop dari thread
+request yang berbeda selama beberapa milidetik, menjalankan satu forward pass
+batch, lalu mengembalikan embedding ke masing-masing request.
+
+Scheduler hanya menunggu jika masih ada request lain yang sedang diproses
+(in-flight); request tunggal langsung dijalankan tanpa tambahan latency.
+Batching hanya efektif pada server multi-thread (app.run bawaan Flask atau
+gunicorn --threads).
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class _Item:
+    """Satu crop wajah yang menunggu embedding"""
+
+    __slots__ = ('crop', 'enqueued', 'done', 'result', 'error')
+
+    def __init__(self, crop):
+        self.crop = crop
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatchScheduler:
+    """Kumpulkan crop dari banyak thread dan embed dalam satu batch"""
+
+    def __init__(self, embed_fn, max_batch=16, max_wait_ms=5.0):
+        """
+        Args:
+            embed_fn: Fungsi list crop -> array embedding (n, dim)
+            max_batch: Jumlah crop maksimal per forward pass
+            max_wait_ms: Waktu tunggu maksimal sejak crop pertama masuk antrian
+        """
+        self.embed_fn = embed_fn
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._worker = None
+
+        # Statistik
+        self._requests = 0
+        self._batches = 0
+        self._items = 0
+        self._max_batch_seen = 0
+        self._wait_total = 0.0
+        self._infer_total = 0.0
+        self._batch_sizes = {}
+
+    def _ensure_worker(self):
+        """Start thread worker secara lazy (aman setelah fork gunicorn)"""
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='facenet-batcher', daemon=True)
+            self._worker.start()
+
+    @contextmanager
+    def request(self):
+        """
+        Tandai satu request sedang diproses (decode/deteksi sampai embedding).
+        Worker menunggu crop dari request in-flight lain sebelum menjalankan batch.
+        """
+        with self._cond:
+            self._in_flight += 1
+            self._requests += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def embed(self, crops):
+        """
+        Embed crop lewat antrian batch bersama
+
+        Args:
+            crops: List crop wajah
+
+        Returns:
+            List embedding sesuai urutan crop
+        """
+        if not crops:
+            return []
+
+        items = [_Item(crop) for crop in crops]
+        with self._cond:
+            self._ensure_worker()
+            self._queue.extend(items)
+            self._cond.notify_all()
+
+        for item in items:
+            item.done.wait()
+            if item.error is not None:
+                raise item.error
+        return [item.result for item in items]
+
+    def _ready(self):
+        """Batch siap jika penuh atau semua request in-flight sudah mengantri"""
+        return len(self._queue) >= min(self.max_batch, max(self._in_flight, 1))
+
+    def _run(self):
+        """Loop worker: kumpulkan batch lalu jalankan forward pass"""
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+
+                deadline = self._queue[0].enqueued + self.max_wait
+                while not self._ready():
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                count = min(len(self._queue), self.max_batch)
+                batch = [self._queue.popleft() for _ in range(count)]
+
+            start = time.perf_counter()
+            try:
+                embeddings = self.embed_fn([item.crop for item in batch])
+                for item, embedding in zip(batch, embeddings):
+                    item.result = embedding
+            except Exception as e:
+                for item in batch:
+                    item.error = e
+            finished = time.perf_counter()
+
+            with self._cond:
+                self._batches += 1
+                self._items += len(batch)
+                self._max_batch_seen = max(self._max_batch_seen, len(batch))
+                self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+                self._wait_total += sum(start - item.enqueued for item in batch)
+                self._infer_total += finished - start
+
+            for item in batch:
+                item.done.set()
+
+    def stats(self):
+        """Statistik antrian dan ukuran batch untuk tuning"""
+        with self._cond:
+            batches = self._batches or 1
+            items = self._items or 1
+            return {
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait * 1000,
+                'queue_depth': len(self._queue),
+                'in_flight': self._in_flight,
+                'requests': self._requests,
+                'batches': self._batches,
+                'embeddings': self._items,
+                'mean_batch_size': self._items / batches,
+                'max_batch_size': self._max_batch_seen,
+                'batch_size_histogram': {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                'mean_queue_wait_ms': self._wait_total / items * 1000,
+                'mean_inference_ms': self._infer_total / batches * 1000,
+            }
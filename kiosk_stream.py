@@ -0,0 +1,124 @@
+"""
+Modul Kiosk Stream - pengenalan wajah streaming untuk kiosk lewat WebSocket
+
+Kiosk mengirim frame kamera terkompresi (JPEG biner atau base64) secara terus
+menerus. Server selalu memproses frame terbaru saja: frame yang menumpuk
+selama frame sebelumnya diproses dibuang. Setiap frame yang diproses
+menghasilkan pesan progress, dan keputusan akhir dikirim begitu wajah dikenali
+dengan yakin (early exit) atau batas waktu habis.
+
+Modul ini tidak bergantung pada Flask; objek ws cukup punya send(data) dan
+receive(timeout) seperti simple_websocket.Server (flask-sock).
+"""
+import json
+import time
+
+
+class LatestFrameReceiver:
+    """Ambil frame terbaru dari WebSocket, buang frame yang sudah basi"""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.received = 0
+        self.dropped = 0
+
+    def next(self, timeout):
+        """
+        Tunggu frame berikutnya lalu kosongkan antrian sehingga hanya frame
+        paling baru yang dikembalikan
+
+        Args:
+            timeout: Waktu tunggu maksimal (detik)
+
+        Returns:
+            Frame (bytes atau str) atau None jika timeout
+        """
+        frame = self.ws.receive(timeout=max(timeout, 0))
+        if frame is None:
+            return None
+        self.received += 1
+
+        while True:
+            newer = self.ws.receive(timeout=0)
+            if newer is None:
+                return frame
+            self.received += 1
+            self.dropped += 1
+            frame = newer
+
+
+def send_json(ws, payload):
+    """Kirim pesan JSON (teks) ke kiosk"""
+    ws.send(json.dumps(payload, default=str))
+
+
+def stream_recognition(ws, recognize, on_match, timeout=15.0, confirm_frames=1):
+    """
+    Loop pengenalan streaming untuk satu sesi kiosk
+
+    Protokol pesan server -> kiosk (JSON):
+        {"type": "progress", "status": "no_face" | "low_quality" | "decode_error"
+                                       | "not_recognized" | "match",
+         "frame": n, "dropped": d, "similarity": s}
+        {"type": "result", "status": <kode HTTP>, "success": ..., "message": ..., "data": ...}
+
+    Args:
+        ws: Koneksi WebSocket
+        recognize: Fungsi frame -> (match_result, reason); reason None jika cocok
+        on_match: Fungsi match_result -> (payload, status_code), mis. logika
+                  check-in yang sama dengan endpoint HTTP
+        timeout: Batas waktu sesi (detik) sebelum keputusan 'tidak dikenali'
+        confirm_frames: Jumlah frame berturut-turut dengan user yang sama
+                        sebelum keputusan dikirim
+
+    Returns:
+        Payload hasil yang dikirim ke kiosk
+    """
+    receiver = LatestFrameReceiver(ws)
+    deadline = time.monotonic() + timeout
+    streak_user = None
+    streak = 0
+
+    while True:
+        remaining = deadline - time.monotonic()
+        frame = receiver.next(remaining) if remaining > 0 else None
+        if frame is None:
+            break
+
+        match_result, reason = recognize(frame)
+        progress = {
+            'type': 'progress',
+            'status': reason or 'match',
+            'frame': receiver.received,
+            'dropped': receiver.dropped,
+        }
+        if match_result is not None:
+            progress['similarity'] = match_result['similarity']
+        send_json(ws, progress)
+
+        if match_result is None:
+            streak_user, streak = None, 0
+            continue
+
+        if match_result['user_id'] == streak_user:
+            streak += 1
+        else:
+            streak_user, streak = match_result['user_id'], 1
+
+        if streak >= confirm_frames:
+            payload, status = on_match(match_result)
+            result = dict(payload, type='result', status=status,
+                          frames=receiver.received, dropped=receiver.dropped)
+            send_json(ws, result)
+            return result
+
+    result = {
+        'type': 'result',
+        'status': 408,
+        'success': False,
+        'message': 'Wajah tidak dikenali dalam batas waktu. Silakan coba lagi.',
+        'frames': receiver.received,
+        'dropped': receiver.dropped,
+    }
+    send_json(ws, result)
+    return result
@@ -0,0 +1,197 @@
+"""
+Script migrasi skema database untuk tabel yang dikelola API Piket
+
+db.create_all() hanya membuat tabel yang belum ada dan tidak mengubah tabel
+yang sudah ada di database SILAB, sehingga perubahan kolom dan index
+dilakukan lewat migrasi bertahap di sini. Versi yang sudah dijalankan
+dicatat di tabel piket_schema_migrations.
+
+Usage:
+    python migrate_db.py          # jalankan migrasi yang belum diterapkan
+    python migrate_db.py --list   # tampilkan status migrasi
+"""
+import argparse
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from cli_app import create_cli_app
+from gallery import encode_vector, parse_vector
+from models import db
+
+
+MIGRATIONS = []
+
+
+def migration(version):
+    """Decorator untuk mendaftarkan fungsi migrasi secara berurutan"""
+    def register(func):
+        MIGRATIONS.append((version, func))
+        return func
+    return register
+
+
+def _columns(conn, table):
+    """Nama kolom yang sudah ada di tabel"""
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+
+# =============================================================================
+# Daftar Migrasi
+# =============================================================================
+
+@migration('0001_vektor_bin_columns')
+def add_binary_vector_columns(conn, config):
+    """Tambah kolom vektor_bin (BLOB) dan jadikan kolom JSON lama nullable"""
+    for table in ('vektor_wajah', 'template_wajah'):
+        if 'vektor_bin' not in _columns(conn, table):
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN vektor_bin BLOB NULL'))
+        if conn.dialect.name == 'mysql':
+            conn.execute(text(f'ALTER TABLE {table} MODIFY vektor JSON NULL'))
+
+
+@migration('0002_vektor_bin_backfill')
+def backfill_binary_vectors(conn, config, batch_size=500):
+    """Konversi vektor JSON lama ke vektor_bin secara bertahap per batch"""
+    dtype = config.get('FACE_VECTOR_DTYPE', 'float32')
+
+    for table, pk in (('vektor_wajah', 'id_vektor_wajah'), ('template_wajah', 'id_template_wajah')):
+        converted = 0
+        last_id = 0
+        while True:
+            rows = conn.execute(text(
+                f'SELECT {pk}, vektor FROM {table} '
+                f'WHERE vektor_bin IS NULL AND vektor IS NOT NULL AND {pk} > :last_id '
+                f'ORDER BY {pk} LIMIT :limit'
+            ), {'last_id': last_id, 'limit': batch_size}).fetchall()
+            if not rows:
+                break
+
+            for row_id, raw in rows:
+                try:
+                    conn.execute(
+                        text(f'UPDATE {table} SET vektor_bin = :blob WHERE {pk} = :id'),
+                        {'blob': encode_vector(parse_vector(raw), dtype), 'id': row_id}
+                    )
+                    converted += 1
+                except Exception as e:
+                    print(f"  ✗ {table} {row_id}: {str(e)}")
+            last_id = rows[-1][0]
+
+        print(f"  {table}: {converted} rows converted to {dtype}")
+
+
+# Index untuk query lookup yang dijalankan setiap check-in / registrasi:
+# (nama index, tabel, kolom)
+LOOKUP_INDEXES = (
+    ('ix_absensi_jadwal_piket_tanggal', 'absensi', ('jadwal_piket', 'tanggal')),
+    ('ix_vektor_wajah_user_id', 'vektor_wajah', ('user_id',)),
+    ('ix_jadwal_piket_user_id', 'jadwal_piket', ('user_id',)),
+    ('ix_periode_piket_isactive', 'periode_piket', ('isactive',)),
+)
+
+
+def has_index(conn, table, columns):
+    """
+    Cek apakah sudah ada index (termasuk index foreign key / primary key)
+    yang diawali kolom-kolom tersebut
+    """
+    inspector = inspect(conn)
+    indexes = [index['column_names'] for index in inspector.get_indexes(table)]
+    primary = inspector.get_pk_constraint(table).get('constrained_columns') or []
+    return any(tuple(existing[:len(columns)]) == tuple(columns) for existing in indexes + [primary])
+
+
+@migration('0003_lookup_indexes')
+def add_lookup_indexes(conn, config):
+    """Tambah index untuk lookup absensi, jadwal_piket, vektor_wajah dan periode aktif"""
+    for name, table, columns in LOOKUP_INDEXES:
+        if has_index(conn, table, columns):
+            print(f"  {table}({', '.join(columns)}): index already exists, skipped")
+            continue
+        conn.execute(text(f'CREATE INDEX {name} ON {table} ({", ".join(columns)})'))
+        print(f"  {table}({', '.join(columns)}): created {name}")
+
+
+@migration('0004_galeri_versi')
+def add_gallery_version_counter(conn, config):
+    """Tambah kolom versi di vektor_wajah_log dan baris counter galeri_versi"""
+    if 'versi' not in _columns(conn, 'vektor_wajah_log'):
+        conn.execute(text('ALTER TABLE vektor_wajah_log ADD COLUMN versi BIGINT NULL'))
+    if not has_index(conn, 'vektor_wajah_log', ('versi',)):
+        conn.execute(text('CREATE INDEX ix_vektor_wajah_log_versi ON vektor_wajah_log (versi)'))
+
+    # Tabel dibuat oleh db.create_all(); baris counter dibuat sekali di sini
+    exists = conn.execute(text('SELECT COUNT(*) FROM galeri_versi WHERE id = 1')).scalar()
+    if not exists:
+        conn.execute(text('INSERT INTO galeri_versi (id, versi) VALUES (1, 0)'))
+
+
+# =============================================================================
+# Runner
+# =============================================================================
+
+def applied_versions(conn):
+    """Versi migrasi yang sudah diterapkan"""
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS piket_schema_migrations ('
+        'version VARCHAR(100) PRIMARY KEY, applied_at DATETIME NOT NULL)'
+    ))
+    return {row[0] for row in conn.execute(text('SELECT version FROM piket_schema_migrations'))}
+
+
+def run_migrations(config):
+    """
+    Jalankan semua migrasi yang belum diterapkan, masing-masing dalam
+    transaksinya sendiri
+
+    Returns:
+        List versi migrasi yang baru diterapkan
+    """
+    with db.engine.begin() as conn:
+        done = applied_versions(conn)
+
+    applied = []
+    for version, func in MIGRATIONS:
+        if version in done:
+            continue
+
+        print(f"→ Applying {version}: {func.__doc__}")
+        with db.engine.begin() as conn:
+            func(conn, config)
+            conn.execute(
+                text('INSERT INTO piket_schema_migrations (version, applied_at) VALUES (:version, :now)'),
+                {'version': version, 'now': datetime.now()}
+            )
+        applied.append(version)
+        print(f"✓ {version}")
+
+    return applied
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Migrasi skema database API Piket')
+    parser.add_argument('--list', action='store_true', help='Tampilkan status migrasi')
+    args = parser.parse_args()
+
+    app = create_cli_app()
+
+    with app.app_context():
+        # Pastikan tabel milik API Piket sudah ada sebelum diubah
+        db.create_all()
+
+        if args.list:
+            with db.engine.begin() as conn:
+                done = applied_versions(conn)
+            for version, func in MIGRATIONS:
+                status = 'applied' if version in done else 'pending'
+                print(f"[{status:>7}] {version} - {func.__doc__}")
+            return
+
+        applied = run_migrations(app.config)
+        print(f"\n{len(applied)} migration(s) applied" if applied else "\nDatabase is up to date")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@
 Database Models untuk API Piket - Integrasi dengan Database SILAB
 """
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -87,7 +88,7 @@ class JadwalPiket(db.Model):
     id = db.Column(db.String(36), primary_key=True)  # UUID
     hari = db.Column(db.String(255), nullable=False)
     kepengurusan_lab_id = db.Column(db.String(36), nullable=False)
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, nullable=True)
     updated_at = db.Column(db.DateTime, nullable=True)
     
@@ -115,7 +116,7 @@ class PeriodePiket(db.Model):
     nama = db.Column(db.String(255), nullable=False)
     tanggal_mulai = db.Column(db.Date, nullable=False)
     tanggal_selesai = db.Column(db.Date, nullable=False)
-    isactive = db.Column(db.Boolean, default=False)
+    isactive = db.Column(db.Boolean, default=False, index=True)
     created_at = db.Column(db.DateTime, nullable=True)
     updated_at = db.Column(db.DateTime, nullable=True)
     
@@ -145,9 +146,13 @@ class VektorWajah(db.Model):
     user_id = db.Column(
         db.String(36), 
         db.ForeignKey('users.id', onupdate='CASCADE', ondelete='CASCADE'),
-        nullable=False
+        nullable=False,
+        index=True
     )
-    vektor = db.Column(db.JSON, nullable=False)
+    # vektor_bin: raw little-endian float32/float16 bytes (format utama)
+    # vektor: JSON lama, hanya dibaca untuk baris yang belum dimigrasi
+    vektor_bin = db.Column(db.LargeBinary, nullable=True)
+    vektor = db.Column(db.JSON, nullable=True)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     updated_at = db.Column(
         db.DateTime,
@@ -168,11 +173,87 @@ class VektorWajah(db.Model):
         }
 
 
+class TemplateWajah(db.Model):
+    """
+    Model untuk tabel template_wajah - Dikelola oleh API Piket
+    
+    Template ringkas per user hasil kompaksi vektor_wajah: satu centroid
+    ter-normalisasi dan beberapa medoid yang beragam (outlier dibuang).
+    """
+    __tablename__ = 'template_wajah'
+    
+    id_template_wajah = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(
+        db.String(36),
+        db.ForeignKey('users.id', onupdate='CASCADE', ondelete='CASCADE'),
+        nullable=False
+    )
+    jenis = db.Column(db.Enum('centroid', 'medoid'), nullable=False)
+    vektor_bin = db.Column(db.LargeBinary, nullable=True)
+    vektor = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    
+    # Backref untuk akses dari Users -> TemplateWajah (users.template_wajah)
+    user = db.relationship('Users', backref=db.backref('template_wajah', cascade='all, delete-orphan', lazy=True))
+    
+    def to_dict(self):
+        """Konversi object ke dictionary"""
+        return {
+            'id_template_wajah': self.id_template_wajah,
+            'user_id': self.user_id,
+            'jenis': self.jenis,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class VektorWajahLog(db.Model):
+    """
+    Model untuk tabel vektor_wajah_log - Dikelola oleh API Piket
+    
+    Setiap perubahan vektor wajah seorang user dicatat sebagai satu baris,
+    bersama versi galeri (galeri_versi) yang didapat di transaksi yang sama.
+    """
+    __tablename__ = 'vektor_wajah_log'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.String(36), nullable=False)
+    versi = db.Column(db.BigInteger, nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    
+    def to_dict(self):
+        """Konversi object ke dictionary"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'versi': self.versi,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class GaleriVersi(db.Model):
+    """
+    Model untuk tabel galeri_versi - Dikelola oleh API Piket
+    
+    Satu baris counter versi galeri wajah. Counter dinaikkan dengan
+    UPDATE ... SET versi = versi + 1 di transaksi yang sama dengan perubahan
+    vektor; lock baris membuat transaksi penulis berikutnya menunggu commit,
+    sehingga urutan versi selalu sama dengan urutan commit (berbeda dengan
+    id autoincrement yang bisa di-commit tidak berurutan).
+    """
+    __tablename__ = 'galeri_versi'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    versi = db.Column(db.BigInteger, nullable=False, default=0)
 
 
 class Absensi(db.Model):
     """Model untuk tabel absensi dari database SILAB - Dikelola oleh API Piket"""
     __tablename__ = 'absensi'
+    # Lookup absensi hari ini per jadwal piket (mulai/akhiri piket).
+    # Index pada tabel SILAB yang sudah ada ditambahkan lewat migrate_db.py
+    __table_args__ = (
+        db.Index('ix_absensi_jadwal_piket_tanggal', 'jadwal_piket', 'tanggal'),
+    )
     
     id = db.Column(db.String(36), primary_key=True)  # UUID
     tanggal = db.Column(db.Date, nullable=False)
@@ -196,6 +277,16 @@ class Absensi(db.Model):
     periode = db.relationship('PeriodePiket', foreign_keys=[periode_piket_id], 
                              backref=db.backref('absensi_periode', lazy=True))
     
+    @classmethod
+    def query_with_user(cls):
+        """
+        Query absensi dengan JadwalPiket dan Users ikut di-load dalam satu
+        JOIN, sehingga to_dict() tidak memicu SELECT tambahan per baris
+        """
+        return cls.query.options(
+            joinedload(cls.jadwal_piket_rel).joinedload(JadwalPiket.user)
+        )
+    
     def get_user_id(self):
         """Get user_id from jadwal_piket relationship"""
         if self.jadwal_piket_rel:
@@ -208,8 +299,18 @@ class Absensi(db.Model):
             return self.jadwal_piket_rel.user
         return None
     
-    def to_dict(self):
-        """Konversi object ke dictionary"""
+    def to_dict(self, user_id=None, name=None):
+        """
+        Konversi object ke dictionary
+        
+        Args:
+            user_id: user_id yang sudah diketahui pemanggil (mis. hasil face
+                     match), opsional
+            name: Nama user yang sudah diketahui pemanggil, opsional
+        
+        Tanpa user_id/name, data user diambil dari relasi jadwal_piket_rel
+        (gunakan query_with_user() agar relasi sudah ter-load).
+        """
         # Calculate duration if both jam_masuk and jam_keluar exist
         durasi = None
         if self.jam_masuk and self.jam_keluar:
@@ -221,12 +322,15 @@ class Absensi(db.Model):
             minutes = (delta.seconds % 3600) // 60
             durasi = f"{hours} jam {minutes} menit"
         
-        user = self.get_user()
+        if user_id is None:
+            user = self.get_user()
+            user_id = self.get_user_id()
+            name = user.name if user else None
         
         return {
             'id': self.id,
-            'user_id': self.get_user_id(),
-            'name': user.name if user else None,
+            'user_id': user_id,
+            'name': name,
             'tanggal': self.tanggal.isoformat() if self.tanggal else None,
             'jam_masuk': self.jam_masuk.strftime('%H:%M:%S') if self.jam_masuk else None,
             'jam_keluar': self.jam_keluar.strftime('%H:%M:%S') if self.jam_keluar else None,
@@ -0,0 +1,88 @@
+"""
+Modul Quantization - representasi ringkas matriks galeri untuk scoring
+
+Mode yang tersedia:
+    none    : float32 (tanpa kuantisasi)
+    float16 : setengah presisi
+    int8    : int8 dengan skala per vektor (x ~= codes * scale)
+
+Skor dari representasi terkuantisasi hanya dipakai untuk memilih kandidat;
+keputusan akhir selalu dihitung ulang dengan float32.
+"""
+import numpy as np
+
+
+class QuantizedMatrix:
+    """Matriks galeri terkuantisasi beserta skala per baris (untuk int8)"""
+
+    def __init__(self, mode, codes, scales=None):
+        self.mode = mode
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def nbytes(self):
+        """Ukuran memori representasi terkuantisasi"""
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def take(self, rows):
+        """Ambil subset baris"""
+        scales = self.scales[rows] if self.scales is not None else None
+        return QuantizedMatrix(self.mode, self.codes[rows], scales)
+
+    def concat(self, other):
+        """Gabungkan dengan matriks terkuantisasi lain (mode sama)"""
+        scales = None
+        if self.scales is not None:
+            scales = np.concatenate([self.scales, other.scales])
+        return QuantizedMatrix(self.mode, np.concatenate([self.codes, other.codes]), scales)
+
+    def scores(self, query, rows=None, block_size=4096):
+        """
+        Hitung skor perkiraan (dot product) terhadap query float32.
+        Dekuantisasi dilakukan per blok agar memori sementara tetap kecil.
+
+        Args:
+            query: Query float32 ter-normalisasi
+            rows: Batasi ke baris tertentu (None = semua baris)
+            block_size: Jumlah baris per blok
+
+        Returns:
+            Array skor float32
+        """
+        source = self if rows is None else self.take(rows)
+        n = source.codes.shape[0]
+        scores = np.empty(n, dtype=np.float32)
+        for start in range(0, n, block_size):
+            block = source.codes[start:start + block_size].astype(np.float32)
+            scores[start:start + block_size] = block @ query
+
+        if source.scales is not None:
+            scores *= source.scales
+        return scores
+
+
+def quantize(matrix, mode):
+    """
+    Kuantisasi matriks galeri float32
+
+    Args:
+        matrix: Matriks float32 (n, dim) ter-normalisasi
+        mode: 'none', 'float16' atau 'int8'
+
+    Returns:
+        QuantizedMatrix, atau None untuk mode 'none'
+    """
+    if mode in (None, 'none', 'float32'):
+        return None
+
+    if mode == 'float16':
+        return QuantizedMatrix(mode, matrix.astype(np.float16))
+
+    if mode == 'int8':
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return QuantizedMatrix(mode, codes, scales.astype(np.float32))
+
+    raise ValueError(f"Unknown GALLERY_QUANTIZATION: {mode}")